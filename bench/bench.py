@@ -0,0 +1,203 @@
+"""
+benchmarks of interpret.py
+
+Runs the IPPcode19 programs of this directory, measures executed instructions per second, peak RSS
+and startup time (run of an empty program) and compares them with baseline.json. Times depend on the
+machine, so they are saved and compared relative to a reference run right before each run of a workload
+(startup of python itself and speed of a plain python loop), the median of repeated runs counts. The
+script exits with 1 if some value is worse than the baseline by more than the tolerance.
+
+python3 bench/bench.py [--repeat=n] [--tolerance=x] [--update] [--interpreter=file] [workload ...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+baselineFile = os.path.join(benchDir, 'baseline.json')
+
+# programs (name.xml in this directory) and what they measure
+workloads = {
+    'arith': 'arithmetic loop (ADD, SUB, MUL, IDIV, LT, jumps)',
+    'strings': 'building a string by CONCAT, SETCHAR and GETCHAR scan',
+    'recursion': 'recursive fibonacci (CALL, RETURN, frames)',
+    'stack': 'PUSHS and POPS heavy summing',
+    'read': 'READ of 100000 lines of input'
+}
+# program used for measuring the startup
+startupWorkload = 'empty'
+# iterations of the reference loop
+referenceLoops = 2000000
+# reference loop, a plain python code which does roughly what the interpreter does for an instruction
+referenceCode = ('values = {}\n'
+                 'for i in range(%d):\n'
+                 '    values[i & 255] = values.get((i - 1) & 255, 0) + i\n' % referenceLoops)
+
+
+def readInput(file):
+    """
+    input of the read workload, 50000 pairs of a number and a string
+    """
+    file.write('50000\n')
+    for i in range(50000):
+        file.write(str(i % 1000 - 500) + '\n')
+        file.write('line' + str(i) * (i % 5) + '\n')
+
+# generators of input files of workloads
+inputs = {'read': readInput}
+
+
+def runOnce(interpreter, name, inputFile, statiFile):
+    """
+    runs the program once and returns wall time, peak RSS in KiB (0 where it can't be measured) and number
+    of executed instructions
+    """
+    args = [sys.executable, interpreter, '--source=' + os.path.join(benchDir, name + '.xml'),
+            '--stati=' + statiFile, '--insts']
+    if inputFile is not None:
+        args.append('--input=' + inputFile)
+    start = time.perf_counter()
+    process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+    peakRss = 0
+    if hasattr(os, 'wait4'):
+        # wait4 gives resources used by this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        # exit code like Popen.returncode (negative signal number if the child was killed)
+        returnCode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        # the child has been waited for already, Popen mustn't wait for it again
+        process.returncode = returnCode
+        peakRss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    else:
+        # Windows, RSS isn't measured
+        returnCode = process.wait()
+    elapsed = time.perf_counter() - start
+    if returnCode != 0:
+        sys.stderr.write('Workload ' + name + ' failed with exit code ' + str(returnCode) + '.\n')
+        sys.exit(2)
+    with open(statiFile) as file:
+        insts = int(file.read().split()[0])
+    return elapsed, peakRss, insts
+
+
+def runReference(code):
+    """
+    runs python with the code once and returns wall time
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def measure(interpreter, name, repeat, tmpDir, reference):
+    """
+    runs the program repeat times, each run after a run of the reference code, and returns list of pairs
+    (wall time of the program, wall time of the reference), the biggest RSS and number of executed instructions
+    """
+    inputFile = None
+    if name in inputs:
+        inputFile = os.path.join(tmpDir, name + '.in')
+        if not os.path.exists(inputFile):
+            with open(inputFile, 'w') as file:
+                inputs[name](file)
+    statiFile = os.path.join(tmpDir, name + '.stati')
+    times = []
+    peakRss = 0
+    for _ in range(repeat):
+        # the reference runs next to the program, so both are slowed down by the same load of the machine
+        referenceElapsed = runReference(reference)
+        elapsed, rss, insts = runOnce(interpreter, name, inputFile, statiFile)
+        times.append((elapsed, referenceElapsed))
+        peakRss = max(peakRss, rss)
+    return times, peakRss, insts
+
+
+def compare(value, baseline, higherIsBetter, tolerance):
+    """
+    returns the change against the baseline as text and whether it is a regression
+    """
+    if not baseline:
+        return '', False
+    change = value / baseline - 1
+    if higherIsBetter:
+        regression = change < -tolerance
+    else:
+        regression = change > tolerance
+    return '%+.1f%%' % (100 * change) + (' !' if regression else ''), regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of interpret.py.')
+    parser.add_argument('workloads', nargs='*', help='workloads to run (all by default): ' + ', '.join(workloads))
+    parser.add_argument('--interpreter', default=os.path.join(benchDir, '..', 'interpret.py'))
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each workload, the median of them counts')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--update', action='store_true', help='save the results as the new baseline')
+    arguments = parser.parse_args()
+
+    names = arguments.workloads or list(workloads)
+    for name in names:
+        if name not in workloads:
+            parser.error('unknown workload ' + name)
+
+    baseline = {'startup': 0, 'workloads': {}}
+    if os.path.exists(baselineFile):
+        with open(baselineFile) as file:
+            baseline = json.load(file)
+
+    regressions = []
+    results = {'startup': 0, 'workloads': {}}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        times, startupRss, _ = measure(arguments.interpreter, startupWorkload, arguments.repeat, tmpDir, 'pass')
+        startup = statistics.median(elapsed for elapsed, _ in times)
+        referenceStartup = statistics.median(referenceElapsed for _, referenceElapsed in times)
+        # multiple of the python startup
+        relativeStartup = statistics.median(elapsed / referenceElapsed for elapsed, referenceElapsed in times)
+        results['startup'] = relativeStartup
+        change, regression = compare(relativeStartup, baseline.get('startup'), False, arguments.tolerance)
+        print('startup: %.3f s, %.2fx python (baseline %.2fx) %s, peak RSS %d KiB' % (startup, relativeStartup,
+              baseline.get('startup', 0), change, startupRss))
+        if regression:
+            regressions.append('startup')
+
+        print('%-10s %10s %12s %10s %10s %9s %10s %10s %9s' % ('workload', 'insts', 'insts/s', 'relative', 'baseline',
+                                                              'change', 'RSS [KiB]', 'baseline', 'change'))
+        for name in names:
+            times, peakRss, insts = measure(arguments.interpreter, name, arguments.repeat, tmpDir, referenceCode)
+            # time of the startup isn't counted to the speed of instructions
+            instsPerSec = insts / max(statistics.median(elapsed for elapsed, _ in times) - startup, 1e-6)
+            # instructions per one loop of the reference code
+            relativeSpeed = statistics.median((insts / max(elapsed - startup, 1e-6)) /
+                                              (referenceLoops / max(referenceElapsed - referenceStartup, 1e-6))
+                                              for elapsed, referenceElapsed in times)
+            results['workloads'][name] = {'insts': insts, 'relativeSpeed': relativeSpeed, 'peakRss': peakRss}
+            old = baseline['workloads'].get(name, {})
+            speedChange, speedRegression = compare(relativeSpeed, old.get('relativeSpeed'), True, arguments.tolerance)
+            rssChange, rssRegression = compare(peakRss, old.get('peakRss'), False, arguments.tolerance)
+            print('%-10s %10d %12.0f %10.4f %10.4f %9s %10d %10d %9s' % (name, insts, instsPerSec, relativeSpeed,
+                                                                       old.get('relativeSpeed', 0), speedChange, peakRss,
+                                                                       old.get('peakRss', 0), rssChange))
+            if old and insts != old.get('insts'):
+                print('  number of executed instructions changed from %d' % old['insts'])
+            if speedRegression or rssRegression:
+                regressions.append(name)
+
+    if arguments.update:
+        # workloads which weren't run keep their old values
+        for name, values in baseline['workloads'].items():
+            results['workloads'].setdefault(name, values)
+        with open(baselineFile, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write('\n')
+        print('Baseline saved.')
+    elif regressions:
+        print('Regressions: ' + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,24 @@ import argparse
 import sys
 import xml.etree.ElementTree as ET
 import re
+import gc
+import mmap
+import os
+import io
+import hashlib
+import multiprocessing
+import bisect
+import copy
+import operator
+import json
+import time
+import signal
+import threading
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
 
 allowedInstructions = {
             'move': 'v s',
@@ -44,7 +62,271 @@ allowedInstructions = {
             'break': ''
 }
 
-instructionTree = {}
+# operands of opcodes (v - var, s - symb, l - label, t - type)
+operandSignatures = {opcode: tuple(args.split()) for opcode, args in allowedInstructions.items()}
+
+# patterns for checking operands (compiled only once), constants are checked according to their type
+identifier = r'[a-zA-Z_\-$&%*!?][a-zA-Z0-9_\-$&%*!?]*'
+varPattern = re.compile(r'(?:LF|GF|TF)@' + identifier)
+labelPattern = re.compile(identifier)
+# order of an instruction, without sign and leading zeros
+orderPattern = re.compile(r'[1-9][0-9]*')
+constantPatterns = {
+    'int': re.compile(r'[+-]?[0-9]+'),
+    'bool': re.compile(r'true|false'),
+    'nil': re.compile(r'nil'),
+    'string': re.compile(r'(?:[^\s#\\]|\\[0-9]{3})*')
+}
+
+# opcode numbers used by compiled instructions, the number of an opcode is its index
+opcodes = list(allowedInstructions)
+opcodeNumbers = {opcode: number for number, opcode in enumerate(opcodes)}
+
+# frequent sequences of opcodes which are run as one superinstruction (--fuse), only the last one can jump,
+# a label before a sequence (or before any other instruction) is fused with it too
+fusedSequences = {(arithmetic, comparison, jump) for arithmetic in ('add', 'sub')
+                  for comparison in ('lt', 'gt', 'eq') for jump in ('jumpifeq', 'jumpifneq')}
+fusedSequences |= {(comparison, jump) for comparison in ('lt', 'gt', 'eq') for jump in ('jumpifeq', 'jumpifneq')}
+fusedSequences |= {('pushs', 'pushs', 'pops'), ('pushs', 'pops'), ('pushs', 'pushs'), ('pops', 'pops'),
+                   ('createframe', 'pushframe', 'call'), ('createframe', 'pushframe'), ('popframe', 'return'),
+                   ('defvar', 'move'), ('defvar', 'pops'), ('move', 'move'), ('move', 'jump'), ('move', 'return')}
+maxFusedLength = max(len(sequence) for sequence in fusedSequences)
+# the most instructions which do nothing run by one dispatch (--optimize)
+maxNoops = 32
+
+# types of values which instructions set to their first operand (--infer-types), move, read and pops are handled apart
+resultTypes = {'add': 'int', 'sub': 'int', 'mul': 'int', 'idiv': 'int', 'lt': 'bool', 'gt': 'bool', 'eq': 'bool',
+               'and': 'bool', 'or': 'bool', 'not': 'bool', 'int2char': 'string', 'stri2int': 'int', 'concat': 'string',
+               'strlen': 'int', 'getchar': 'string', 'setchar': 'string', 'type': 'string'}
+# types of read operands with which instructions can't fail on types (setchar reads its first operand too)
+typedSignatures = {'add': ('int', 'int'), 'sub': ('int', 'int'), 'mul': ('int', 'int'), 'idiv': ('int', 'int'),
+                   'and': ('bool', 'bool'), 'or': ('bool', 'bool'), 'not': ('bool',), 'int2char': ('int',),
+                   'stri2int': ('string', 'int'), 'concat': ('string', 'string'), 'strlen': ('string',),
+                   'getchar': ('string', 'int'), 'setchar': ('string', 'int', 'string')}
+valueTypes = ('int', 'bool', 'string', 'nil')
+# instructions which can jump, the last ones of basic blocks
+jumpingOpcodes = ('jump', 'jumpifeq', 'jumpifneq', 'call', 'return', 'exit')
+# Python operators of instructions translated by --backend=pycompile
+binaryOperators = {'add': '+', 'sub': '-', 'mul': '*', 'lt': '<', 'gt': '>', 'eq': '==', 'and': 'and', 'or': 'or'}
+# the most instructions of a basic block, a block is compiled to one Python function (--backend=pycompile)
+# and limits are checked only between blocks
+maxBlockLength = 256
+
+escapeSeqPattern = re.compile(r'\\([0-9]{3})')
+# characters which have to be written as escape sequences in string constants
+escapedCharsPattern = re.compile(r'[\x00-\x20#\\]')
+
+class Nil:
+    """
+    type of the nil@nil value, the only instance is nil
+    """
+    def __repr__(self):
+        return 'nil'
+
+nil = Nil()
+
+# content of a slot of variable which hasn't been defined yet
+undefined = object()
+
+class Rope:
+    """
+    long string value stored in chunks, so that concat and setchar don't have to copy the whole string
+
+    Ropes are immutable like other values, but more ropes may share one list of chunks. Each rope
+    uses only the first count chunks of the list, the rest of the string (shorter than chunkSize)
+    is in tail. A rope may append to the shared lists only if nobody has appended to them before,
+    otherwise it copies them first. Ends are the indexes where the chunks end.
+    """
+    chunkSize = 4096
+    __slots__ = ('chunks', 'ends', 'count', 'tail', 'length', 'flat')
+
+    def __init__(self, chunks, ends, count, tail):
+        self.chunks = chunks
+        self.ends = ends
+        self.count = count
+        self.tail = tail
+        self.length = (ends[count - 1] if count else 0) + len(tail)
+        self.flat = None
+
+    @staticmethod
+    def concat(left, right):
+        """
+        returns left + right, short results stay ordinary strings
+        """
+        if type(right) is Rope:
+            right = str(right)
+        if type(left) is not Rope:
+            if len(left) + len(right) < Rope.chunkSize:
+                return left + right
+            left = Rope([], [], 0, left)
+        return left._append(right)
+
+    @staticmethod
+    def replace(string, index, char):
+        """
+        returns the string with the character at index replaced by char
+        """
+        if type(string) is not Rope:
+            if len(string) < Rope.chunkSize:
+                return string[:index] + char + string[index + 1:]
+            string = Rope([], [], 0, '')._append(string)
+        return string._replace(index, char)
+
+    def _append(self, text):
+        chunks, ends, count = self.chunks, self.ends, self.count
+        tail = self.tail + text
+        if len(tail) >= Rope.chunkSize:
+            if count != len(chunks) or count != len(ends):
+                chunks = chunks[:count]
+                ends = ends[:count]
+            end = ends[-1] if count else 0
+            full = len(tail) - len(tail) % Rope.chunkSize
+            for start in range(0, full, Rope.chunkSize):
+                chunks.append(tail[start:start + Rope.chunkSize])
+                end += Rope.chunkSize
+                ends.append(end)
+                count += 1
+            tail = tail[full:]
+        return Rope(chunks, ends, count, tail)
+
+    def _find(self, index):
+        """
+        returns number of the chunk containing index and the position in it
+        """
+        chunk = bisect.bisect_right(self.ends, index, 0, self.count)
+        return chunk, index - (self.ends[chunk - 1] if chunk else 0)
+
+    def _replace(self, index, char):
+        tailStart = self.length - len(self.tail)
+        if index >= tailStart:
+            index -= tailStart
+            return Rope(self.chunks, self.ends, self.count, self.tail[:index] + char + self.tail[index + 1:])
+        chunk, position = self._find(index)
+        chunks = self.chunks[:self.count]
+        chunks[chunk] = chunks[chunk][:position] + char + chunks[chunk][position + 1:]
+        return Rope(chunks, self.ends, self.count, self.tail)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        tailStart = self.length - len(self.tail)
+        if index >= tailStart:
+            return self.tail[index - tailStart]
+        chunk, position = self._find(index)
+        return self.chunks[chunk][position]
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = ''.join(self.chunks[:self.count]) + self.tail
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __eq__(self, other):
+        if type(other) is Rope:
+            return self.length == other.length and str(self) == str(other)
+        if type(other) is str:
+            return str(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __lt__(self, other):
+        if type(other) in (str, Rope):
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __gt__(self, other):
+        if type(other) in (str, Rope):
+            return str(self) > str(other)
+        return NotImplemented
+
+# names of IPPcode19 types according to Python types of values
+typeNames = {int: 'int', bool: 'bool', str: 'string', Nil: 'nil', Rope: 'string'}
+
+def typeOfValue(value):
+    """
+    returns IPPcode19 type of a value, uninitialised variable (None) has no type
+    """
+    if value is None:
+        return ''
+    return typeNames[type(value)]
+
+def valueToString(value):
+    """
+    converts a value to its text form used by write, dprint and break
+    """
+    if value is True:
+        return 'true'
+    elif value is False:
+        return 'false'
+    elif value is nil:
+        return ''
+    return str(value)
+
+def convertEscapeSeqs(toConvert):
+    """
+    replaces escape sequences (\\ddd) in a string constant by the characters
+    """
+    return escapeSeqPattern.sub(lambda match: chr(int(match.group(1))), toConvert)
+
+def encodeEscapeSeqs(toConvert):
+    """
+    replaces characters which can't be written directly in a string constant by escape sequences
+    """
+    return escapedCharsPattern.sub(lambda match: '\\%03d' % ord(match.group()), toConvert)
+
+def valueToLiteral(value):
+    """
+    converts a value to the text of IPPcode19 constant, used by dumps of frames and stack in break
+    """
+    if typeOfValue(value) == 'string':
+        return encodeEscapeSeqs(str(value))
+    return valueToString(value)
+
+def memoryUsage():
+    """
+    returns memory used by this process (resident set size) in bytes, only the peak is known on systems without /proc
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as statm:
+            return int(statm.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+def constantValue(type, val):
+    """
+    converts a constant from XML to its value
+    """
+    if type == 'int':
+        return int(val)
+    elif type == 'bool':
+        return val == 'true'
+    elif type == 'nil':
+        return nil
+    return convertEscapeSeqs(val)
+
+
+class CheckError(Exception):
+    """
+    error found by checks of the program, the one who runs the checks reports it (message to stderr and exit code),
+    so an error in the structure can wait until it is known whether the rest of XML is well-formed
+    """
+    def __init__(self, message, code):
+        Exception.__init__(self, message)
+        self.message = message
+        self.code = code
+
 
 class MyParser(argparse.ArgumentParser):
     """
@@ -58,6 +340,9 @@ class Instruction:
     """
     represents an instruction with its arguments
     """
+    # number of instructions of the program executed by one dispatch (more for Superinstruction)
+    count = 1
+
     def __init__(self, opcode, arg1Type='', arg1Val='', arg2Type='', arg2Val='', arg3Type='', arg3Val=''):
         self.opcode = opcode.lower()
         self.arg1Type = arg1Type
@@ -66,6 +351,8 @@ class Instruction:
         self.arg1Val = arg1Val
         self.arg2Val = arg2Val
         self.arg3Val = arg3Val
+        # decoded values of constant operands
+        self.values = [None, None, None]
 
     def __str__(self):
         """
@@ -75,1185 +362,2598 @@ class Instruction:
 
     def checkOpcode(self):
         """
-        checks if instruction is allowed
+        checks if instruction is allowed, raises CheckError if it isn't
         """
         if self.opcode not in allowedInstructions:
-            sys.stderr.write('Unsupported instruction.\n')
-            sys.exit(32)
+            raise CheckError('Unsupported instruction.\n', 32)
 
     def checkCorrectArgs(self):
         """
-        checks variables, symbols, labels etc.
-        """
-        def checkVar(val):
-            pattern = re.compile(r'^(?:L|G|T)F@(?:[a-zA-Z]|_|-|\\$|&|%|\*|!|\?)(?:[a-zA-Z0-9]|_|-|\\$|&|%|\*|!|\?)*$')
-            if not re.match(pattern, val):
-                sys.stderr.write('Regex for variable doesn\'t match!\n')
-                sys.exit(32)
-
-        def checkSymb(val):
-            pattern = re.compile(r'(?:^(?:L|G|T)F@(?:[a-zA-Z]|_|-|\\$|&|%|\*|!|\?)(?:[a-zA-Z0-9]|_|-|\\$|&|%|\*|!|\?)*$)')
-            pattern2 = re.compile(r'^(bool@true|bool@false|int@(?:\+|-)?[0-9]*|nil@nil|string@(?:[^\s#\\]|\\[0-9][0-9][0-9])(?:[^\s#\\]|\\[0-9][0-9][0-9])*|string@)$')
-            if not re.match(pattern, val) and not re.match(pattern2, val):
-                sys.stderr.write('Regex for symbol doesn\'t match!\n')
-                sys.exit(32)
-
-        def checkLabel(val):
-            pattern = re.compile(r'^(?:[a-zA-Z]|_|-|\$|&|%|\*|!|\?)(?:[a-zA-Z0-9]|_|-|\$|&|%|\*|!|\?)*$')
-            if not re.match(pattern, val):
-                sys.stderr.write('Regex for label doesn\'t match!\n')
-                sys.exit(32)
-
-        def checkType(val):
-            if val != 'int' and val != 'string' and val != 'bool':
-                sys.stderr.write('Regex for type doesn\'t match!\n')
-                sys.exit(32)
-
-        allowedArgs = allowedInstructions[self.opcode]
-        if allowedArgs == '':
-            if self.arg1Val != '' or self.arg1Val != '':
-                sys.stderr.write('Opcode ' + self.opcode + ' can\'t have any operands!\n')
-                sys.exit(32)
-        singleArgs = allowedArgs.split(' ')
-        a = 1
-        for s in singleArgs:
-            type = ''
-            val = ''
-            if a == 1:
-                type = self.arg1Type
-                val = self.arg1Val
-            elif a == 2:
-                type = self.arg2Type
-                val = self.arg2Val
-            else:
-                type = self.arg3Type
-                val = self.arg3Val
-
-            if s == 'v':
-                if type != 'var':
-                    sys.stderr.write('This operand should be var!\n')
-                    sys.exit(32)
-                checkVar(val)
-            elif s == 's':
-                if type != 'var' and type != 'int' and type != 'nil' and type != 'string' and type != 'float' and type != 'bool':
-                    sys.stderr.write('This operand should be symb!' + type + '\n')
-                    sys.exit(32)
+        checks variables, symbols, labels etc. according to the signature of the opcode
+        decoded values of constants are saved to values, an error raises CheckError
+        """
+        args = ((self.arg1Type, self.arg1Val), (self.arg2Type, self.arg2Val), (self.arg3Type, self.arg3Val))
+        signature = operandSignatures[self.opcode]
+        if len(signature) < 3 and args[len(signature)][0] != '':
+            raise CheckError('Opcode ' + self.opcode + ' can\'t have so many operands!\n', 32)
+        for i, kind in enumerate(signature):
+            type, val = args[i]
+            if kind == 'v':
                 if type != 'var':
-                    sendToControl = type + '@' + val
+                    raise CheckError('This operand should be var!\n', 32)
+                if not varPattern.fullmatch(val):
+                    raise CheckError('Regex for variable doesn\'t match!\n', 32)
+            elif kind == 's':
+                if type == 'var':
+                    if not varPattern.fullmatch(val):
+                        raise CheckError('Regex for symbol doesn\'t match!\n', 32)
+                elif type in constantPatterns:
+                    if not constantPatterns[type].fullmatch(val):
+                        raise CheckError('Regex for symbol doesn\'t match!\n', 32)
+                    self.values[i] = constantValue(type, val)
                 else:
-                    sendToControl = val
-                checkSymb(sendToControl)
-            elif s == 'l':
+                    raise CheckError('This operand should be symb!' + type + '\n', 32)
+            elif kind == 'l':
                 if type != 'label':
-                    sys.stderr.write('This operand should be label!' + self.opcode + ' ' + type + '\n')
-                    sys.exit(32)
-                checkLabel(val)
-            elif s == 't':
+                    raise CheckError('This operand should be label!' + self.opcode + ' ' + type + '\n', 32)
+                if not labelPattern.fullmatch(val):
+                    raise CheckError('Regex for label doesn\'t match!\n', 32)
+            else:
                 if type != 'type':
-                    sys.stderr.write('This operand should be type!\n')
-                    sys.exit(32)
-                checkType(val)
-            a += 1
+                    raise CheckError('This operand should be type!\n', 32)
+                if val != 'int' and val != 'string' and val != 'bool':
+                    raise CheckError('Regex for type doesn\'t match!\n', 32)
+
+    def toCache(self):
+        """
+        returns the checked instruction as a tuple of strings (saved by ProgramCache)
+        """
+        return (self.opcode, self.arg1Type, self.arg1Val, self.arg2Type, self.arg2Val, self.arg3Type, self.arg3Val)
+
+    @staticmethod
+    def fromCache(data):
+        """
+        creates an already checked instruction from the tuple made by toCache
+        """
+        ins = Instruction(*data)
+        for i, (type, val) in enumerate(((ins.arg1Type, ins.arg1Val), (ins.arg2Type, ins.arg2Val), (ins.arg3Type, ins.arg3Val))):
+            if type in ('int', 'bool', 'nil', 'string'):
+                ins.values[i] = constantValue(type, val)
+        return ins
+
+    def compile(self, labels, globalSlots, localSlots):
+        """
+        translates opcode to its number and prepares operands, so they don't have to be parsed during interpretation
+        variables are bound to their frame and slot (slots of GF are in globalSlots, of LF and TF in localSlots)
+        """
+        self.code = opcodeNumbers[self.opcode]
+        self.operands = []
+        args = ((self.arg1Type, self.arg1Val), (self.arg2Type, self.arg2Val), (self.arg3Type, self.arg3Val))
+        for (type, val), value in zip(args, self.values):
+            if type == '':
+                break
+            if type == 'var':
+                frame, at, name = val.partition('@')
+                slots = globalSlots if frame == 'GF' else localSlots
+                self.operands.append((type, val, frame, slots.setdefault(name, len(slots))))
+            elif value is not None:
+                self.operands.append((type, value, None, None))
+            else:
+                self.operands.append((type, val, None, None))
+        self.target = None
+        if self.arg1Type == 'label' and self.opcode != 'label' and self.arg1Val in labels:
+            self.target = labels[self.arg1Val]
+
+
+class Superinstruction:
+    """
+    sequence of instructions of the program (parts) run by one dispatch, code is the index of its handler
+    in the dispatch table of the interpreter, pointers are instruction pointers of the parts
+    """
+    def __init__(self, parts, pointers, code):
+        self.parts = parts
+        self.count = len(parts)
+        self.code = code
+        self.opcode = '+'.join(ins.opcode for ins in parts)
+        # number of parts executed when a part is being executed
+        self.executed = {instructionPointer: i + 1 for i, instructionPointer in enumerate(pointers)}
+
+
+def fusedLength(program, start):
+    """
+    returns the number of instructions from start which can be run as one superinstruction (1 if none)
+    """
+    begin = start + 1 if program[start].opcode == 'label' else start
+    for length in range(maxFusedLength, 0, -1):
+        sequence = tuple(ins.opcode for ins in program[begin:begin + length])
+        if len(sequence) != length:
+            continue
+        if sequence in fusedSequences or (length == 1 and begin > start and sequence[0] != 'label'):
+            return begin - start + length
+    return 1
+
+
+def constantJump(ins):
+    """
+    returns whether a conditional jump with constant operands jumps, None if it depends on variables or fails
+    """
+    symb1, symb2 = ins.operands[1], ins.operands[2]
+    if symb1[0] == 'var' or symb2[0] == 'var' or typeOfValue(symb1[1]) != typeOfValue(symb2[1]):
+        return None
+    return (symb1[1] == symb2[1]) == (ins.opcode == 'jumpifeq')
+
+
+def successors(program, instructionPointer):
+    """
+    returns instruction pointers of instructions which can be executed after the instruction (len(program) is the end),
+    call is followed by its label and by the next instruction, where return returns
+    """
+    ins = program[instructionPointer]
+    if ins.opcode in ('jump', 'jumpifeq', 'jumpifneq', 'call') and ins.target is None:
+        # missing label is an error
+        return ()
+    if ins.opcode == 'jump':
+        return (ins.target,)
+    if ins.opcode in ('jumpifeq', 'jumpifneq'):
+        jumps = constantJump(ins)
+        if jumps is None:
+            return (ins.target, instructionPointer + 1)
+        return (ins.target,) if jumps else (instructionPointer + 1,)
+    if ins.opcode == 'call':
+        return (ins.target, instructionPointer + 1)
+    if ins.opcode in ('return', 'exit'):
+        return ()
+    return (instructionPointer + 1,)
+
+
+def reachableInstructions(program):
+    """
+    returns the set of instruction pointers of instructions which can be executed (control flow graph from the start)
+    """
+    reachable = set()
+    stack = [0] if program else []
+    while stack:
+        instructionPointer = stack.pop()
+        if instructionPointer in reachable or instructionPointer == len(program):
+            continue
+        reachable.add(instructionPointer)
+        stack.extend(successors(program, instructionPointer))
+    return reachable
+
+
+def initialisedGlobals(program, reachable, tracked):
+    """
+    returns slots of tracked GF variables which are surely initialised when the instruction is executed (by instruction pointers),
+    a variable is initialised after an instruction reads it or sets it, then it stays initialised (also after call)
+    """
+    initialised = {}
+    stack = [0] if program else []
+    if stack:
+        initialised[0] = frozenset()
+    while stack:
+        instructionPointer = stack.pop()
+        ins = program[instructionPointer]
+        after = set(initialised[instructionPointer])
+        for kind, operand in zip(operandSignatures[ins.opcode], ins.operands):
+            if operand[0] == 'var' and operand[2] == 'GF' and operand[3] in tracked and (
+                    (kind == 's' and ins.opcode != 'type') or (kind == 'v' and ins.opcode != 'defvar')):
+                after.add(operand[3])
+        for successor in successors(program, instructionPointer):
+            if successor == len(program):
+                continue
+            if successor not in initialised:
+                initialised[successor] = frozenset(after)
+            elif not initialised[successor] <= after:
+                initialised[successor] = initialised[successor] & after
+            else:
+                continue
+            stack.append(successor)
+    return initialised
+
+
+def findNoops(program, reachable):
+    """
+    returns reachable instructions which only pass control to another instruction, as a dict of instruction pointers
+    to (instruction pointer of the next instruction, reason), these are labels, jumps with existing labels, conditional
+    jumps with constant operands and moves of a GF variable to itself when it is surely initialised
+    """
+    selfMoves = [instructionPointer for instructionPointer in reachable if program[instructionPointer].opcode == 'move'
+                 and program[instructionPointer].operands[0][2] == 'GF'
+                 and program[instructionPointer].operands[0][2:] == program[instructionPointer].operands[1][2:]]
+    initialised = {}
+    if selfMoves:
+        initialised = initialisedGlobals(program, reachable, {program[i].operands[0][3] for i in selfMoves})
+    noops = {}
+    for instructionPointer in reachable:
+        ins = program[instructionPointer]
+        if ins.opcode == 'label':
+            noops[instructionPointer] = (instructionPointer + 1, 'label')
+        elif ins.opcode == 'jump' and ins.target is not None:
+            noops[instructionPointer] = (ins.target, 'jump to instruction ' + str(ins.target + 1))
+        elif ins.opcode in ('jumpifeq', 'jumpifneq') and ins.target is not None and constantJump(ins) is not None:
+            if constantJump(ins):
+                noops[instructionPointer] = (ins.target, 'constant condition, jump to instruction ' + str(ins.target + 1))
+            else:
+                noops[instructionPointer] = (instructionPointer + 1, 'constant condition, no jump')
+        elif instructionPointer in selfMoves and ins.operands[0][3] in initialised.get(instructionPointer, ()):
+            noops[instructionPointer] = (instructionPointer + 1, 'move of an initialised variable to itself')
+    return noops
+
+
+def basicBlocks(program, reachable):
+    """
+    returns reachable basic blocks (lists of instruction pointers) by their first instruction pointers, a block starts
+    at the start of the program, at labels and after instructions which can jump, it is split after maxBlockLength
+    """
+    starts = {instructionPointer for instructionPointer in reachable if instructionPointer == 0
+              or program[instructionPointer].opcode == 'label' or program[instructionPointer - 1].opcode in jumpingOpcodes}
+    blocks = {}
+    for start in starts:
+        instructionPointer = start
+        block = blocks[start] = [start]
+        while (program[instructionPointer].opcode not in jumpingOpcodes and instructionPointer + 1 < len(program)
+               and instructionPointer + 1 not in starts):
+            instructionPointer = instructionPointer + 1
+            if len(block) == maxBlockLength:
+                block = blocks[instructionPointer] = []
+            block.append(instructionPointer)
+    return blocks
+
+
+def flowSuccessors(program, instructionPointer, returnSites):
+    """
+    returns instruction pointers which can follow the instruction like successors, but call is followed only
+    by its label and return by all places where it can return (the function can change variables)
+    """
+    ins = program[instructionPointer]
+    if ins.opcode == 'call':
+        return () if ins.target is None else (ins.target,)
+    if ins.opcode == 'return':
+        return returnSites
+    return successors(program, instructionPointer)
+
+
+def operandType(operand, types):
+    """
+    returns the type of a constant or what types know about a variable (None if it may not exist)
+    """
+    if operand[0] != 'var':
+        return operand[0]
+    return types.get(operand[2:])
+
+
+def applyTypes(ins, types):
+    """
+    changes types of variables (dict (frame, slot) -> type) as the instruction changes them if it succeeds,
+    a type is one of valueTypes, '' means uninitialised variable and '?' a variable with unknown value
+    """
+    opcode = ins.opcode
+    if opcode in ('createframe', 'pushframe', 'popframe'):
+        # pushframe makes TF the LF, popframe makes LF the TF, the LF under it isn't known
+        renamed = {}
+        if opcode != 'createframe':
+            old, new = ('TF', 'LF') if opcode == 'pushframe' else ('LF', 'TF')
+            renamed = {(new, key[1]): type for key, type in types.items() if key[0] == old}
+        for key in [key for key in types if key[0] == 'TF' or (opcode != 'createframe' and key[0] == 'LF')]:
+            del types[key]
+        types.update(renamed)
+    elif opcode == 'defvar':
+        types[ins.operands[0][2:]] = ''
+    elif operandSignatures[opcode][:1] == ('v',):
+        if opcode == 'move':
+            type = operandType(ins.operands[1], types)
+        elif opcode == 'read':
+            type = ins.operands[1][1]
+        else:
+            type = resultTypes.get(opcode, '?')
+        types[ins.operands[0][2:]] = type if type in valueTypes else '?'
+
+
+def inferTypes(program, reachable):
+    """
+    returns types of operands (see operandType) of reachable instructions known before they are executed, by instruction
+    pointers, types of variables are followed from the start over basic blocks, where paths meet only types which
+    are the same on all of them are kept
+    """
+    returnSites = tuple(sorted(instructionPointer + 1 for instructionPointer in reachable
+                               if program[instructionPointer].opcode == 'call' and program[instructionPointer].target is not None
+                               and instructionPointer + 1 < len(program)))
+    blocks = basicBlocks(program, reachable)
+
+    blockTypes = {0: {}} if program else {}
+    stack = list(blockTypes)
+    while stack:
+        start = stack.pop()
+        types = dict(blockTypes[start])
+        for instructionPointer in blocks[start]:
+            applyTypes(program[instructionPointer], types)
+        for successor in flowSuccessors(program, blocks[start][-1], returnSites):
+            if successor == len(program):
+                continue
+            if successor in blockTypes:
+                old = blockTypes[successor]
+                merged = {key: type if old[key] == type else '?' for key, type in types.items() if key in old}
+                if merged == old:
+                    continue
+                blockTypes[successor] = merged
+            else:
+                blockTypes[successor] = dict(types)
+            stack.append(successor)
+
+    operandTypes = {}
+    for start, types in blockTypes.items():
+        types = dict(types)
+        for instructionPointer in blocks[start]:
+            ins = program[instructionPointer]
+            operandTypes[instructionPointer] = tuple(operandType(operand, types) for operand in ins.operands)
+            applyTypes(ins, types)
+    return operandTypes
+
+
+def typedInstruction(ins, types):
+    """
+    returns whether the instruction with operands of types (see operandType) can't fail on frames, variables
+    and types (unknown type or variable which may not exist, wrong types, missing label)
+    """
+    opcode = ins.opcode
+    for kind, type in zip(operandSignatures[opcode], types):
+        if (kind == 'v' and type is None) or (kind == 's' and type not in valueTypes):
+            return False
+    if opcode in typedSignatures:
+        read = types if opcode == 'setchar' else types[1:]
+        return read == typedSignatures[opcode]
+    if opcode in ('lt', 'gt'):
+        return types[1] == types[2] and types[1] != 'nil'
+    if opcode in ('eq', 'jumpifeq', 'jumpifneq'):
+        if types[1] != types[2] and (opcode != 'eq' or 'nil' not in types[1:]):
+            return False
+        return opcode == 'eq' or ins.target is not None
+    return opcode == 'move'
 
 
 class XMLTree:
     """
-    represents a tree of instructions made according to XML input
+    loads XML with the program step by step (element after element), checks its syntax
+    and creates instructions, elements are thrown away as soon as they are processed
     """
-    def __init__(self, tree):
-        self.tree = tree
+    def __init__(self, source, jobs=1):
+        self.source = source
+        self.jobs = jobs
+        # checked instructions, keys are orders (strings if they aren't written as positive integers)
+        self.instructions = {}
 
-    def checkValidity(self):
+    def checkProgram(self, root):
         """
-        checks if there is <program> element, <instruction> elements etc.
-        if everything is okay, creates an instruction and add it to the instructionTree
+        checks the <program> element, an error raises CheckError
         """
-        root = self.tree.getroot()
         if root.tag != 'program':
-            sys.stderr.write('The first element must be <program>.\n')
-            sys.exit(32)
+            raise CheckError('The first element must be <program>.\n', 32)
         for attrib in root.attrib:
             if attrib != 'language' and attrib != 'name' and attrib != 'description':
-                sys.stderr.write('The <program> element can\'t have this attribute.\n')
-                sys.exit(32)
+                raise CheckError('The <program> element can\'t have this attribute.\n', 32)
             if attrib == 'language' and root.get('language').lower() != 'ippcode19':
-                sys.stderr.write('The language attribute can\'t have this value.\n')
-                sys.exit(32)
-        for child in root:
-            if child.tag != 'instruction':
-                sys.stderr.write('Unsupported element.\n')
-                sys.exit(32)
+                raise CheckError('The language attribute can\'t have this value.\n', 32)
+
+    def checkInstruction(self, tag, attrib, args):
+        """
+        checks an <instruction> element (given by elementData) with its arguments
+        returns the order and created instruction, an error raises CheckError
+        """
+        if tag != 'instruction':
+            raise CheckError('Unsupported element.\n', 32)
+        try:
+            order = attrib['order']
+            opcode = attrib['opcode']
+        except KeyError:
+            raise CheckError('The <instruction> element needs attributes order and opcode.\n', 32)
+        if len(attrib) != 2:
+            raise CheckError('The <instruction> element can only have two attributes.\n', 32)
+        try:
+            int(order)
+        except ValueError:
+            raise CheckError('The order has to be integer.\n', 32)
+        # orders like 01, +1 or 0 stay strings, so they never fit the sequence 1, 2, ... and the order is wrong
+        if orderPattern.fullmatch(order):
+            order = int(order)
+
+        # arg1, arg2, arg3
+        i = 1
+        arg1 = ''
+        arg1Val = ''
+        arg2 = ''
+        arg2Val = ''
+        arg3 = ''
+        arg3Val = ''
+        args_check = [0, 0, 0]
+        for argTag, argAttrib, text, childs in args:
+            if childs != 0:
+                raise CheckError('The <arg> element can\'t have childs.\n', 32)
             try:
-                order = child.attrib['order']
-                opcode = child.attrib['opcode']
+                type = argAttrib['type']
             except KeyError:
-                sys.stderr.write('The <instruction> element needs attributes order and opcode.\n')
-                sys.exit(32)
-            if len(child.attrib) != 2:
-                sys.stderr.write('The <instruction> element can only have two attributes.\n')
-                sys.exit(32)
+                raise CheckError('The <arg> element needs attribute type.\n', 32)
+            if argTag == 'arg1':
+                arg1 = type
+                arg1Val = text if text is not None else ''
+                if args_check[0] == 0:
+                    args_check[0] = 1
+                else:
+                    raise CheckError('<arg1> is duplicit.\n', 32)
+            elif argTag == 'arg2':
+                arg2 = type
+                arg2Val = text if text is not None else ''
+                if args_check[1] == 0:
+                    args_check[1] = 1
+                else:
+                    raise CheckError('<arg2> is duplicit.\n', 32)
+            elif argTag == 'arg3':
+                arg3 = type
+                arg3Val = text if text is not None else ''
+                if args_check[2] == 0:
+                    args_check[2] = 1
+                else:
+                    raise CheckError('<arg3> is duplicit.\n', 32)
+            else:
+                raise CheckError('Only <arg1>, <arg2> and <arg3> are allowed.\n', 32)
+            i += 1
+
+        # check if args are okay
+        if args_check[1] == 0 and args_check[2] == 1:
+            raise CheckError('You can\'t use <arg3> without <arg2>.\n', 32)
+        elif args_check[0] == 0 and args_check[1] == 1:
+            raise CheckError('You can\'t use <arg2> and without <arg1>.\n', 32)
+
+        # create a new Instruction
+        ins = Instruction(opcode, arg1, arg1Val, arg2, arg2Val, arg3, arg3Val)
+        ins.checkOpcode()
+        ins.checkCorrectArgs()
+
+        return order, ins
+
+    def checkValidity(self):
+        """
+        checks if there is <program> element, <instruction> elements etc.
+        if everything is okay, creates an instruction and add it to the instructions (keys are orders)
+        an error in the structure (32) is reported only when the rest of XML is well-formed, otherwise it is error 31
+        """
+        try:
+            events = ET.iterparse(self.source, events=('start', 'end'))
+        except IOError:
+            sys.stderr.write('Can\'t open the file.\n')
+            sys.exit(11)
+        depth = 0
+        root = None
+        error = None
+        # with more jobs, instructions are checked in batches by worker processes (fork is needed to share this script)
+        pool = None
+        if self.jobs > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            pool = multiprocessing.get_context('fork').Pool(self.jobs)
+        batch = []
+        batches = []
+        try:
+            for event, element in events:
+                if event == 'start':
+                    depth += 1
+                    if depth == 1 and error is None:
+                        root = element
+                        try:
+                            self.checkProgram(root)
+                        except CheckError as e:
+                            error = e
+                    continue
+                depth -= 1
+                if depth != 1:
+                    continue
+                if error is None and pool is not None:
+                    batch.append(elementData(element))
+                    if len(batch) == checkBatchSize:
+                        batches.append(pool.apply_async(checkInstructions, (batch,)))
+                        batch = []
+                elif error is None:
+                    try:
+                        order, ins = self.checkInstruction(*elementData(element))
+                        self.instructions[order] = ins
+                    except CheckError as e:
+                        error = e
+                # processed instructions aren't needed anymore
+                root.clear()
+        except ET.ParseError:
+            if pool is not None:
+                pool.terminate()
+            sys.stderr.write('Your XML is not well-formed.\n')
+            sys.exit(31)
+        if error is not None:
+            if pool is not None:
+                pool.terminate()
+            sys.stderr.write(error.message)
+            sys.exit(error.code)
+        if pool is not None:
+            if batch:
+                batches.append(pool.apply_async(checkInstructions, (batch,)))
+            self._mergeBatches(pool, batches)
+
+    def _mergeBatches(self, pool, batches):
+        """
+        adds instructions checked by workers in order of the document, the first error found ends the program
+        """
+        try:
+            for result in batches:
+                for order, data in result.get():
+                    if order is None:
+                        message, code = data
+                        sys.stderr.write(message)
+                        sys.exit(code)
+                    self.instructions[order] = Instruction.fromCache(data)
+        finally:
+            pool.terminate()
+
+
+# number of instructions sent to a worker at once (--jobs)
+checkBatchSize = 2000
+
+def elementData(element):
+    """
+    returns tag, attributes and arguments of an element, arguments are tuples (tag, attributes, text, number of childs)
+    """
+    return element.tag, element.attrib, [(arg.tag, arg.attrib, arg.text, len(arg)) for arg in element]
+
+def checkInstructions(elements):
+    """
+    checks a batch of <instruction> elements (given by elementData) in a worker process
+    returns list of (order, data for Instruction.fromCache), the first error ends the list as (None, (message, exit code))
+    """
+    tree = XMLTree(None)
+    checked = []
+    try:
+        for element in elements:
+            order, ins = tree.checkInstruction(*element)
+            checked.append((order, ins.toCache()))
+    except CheckError as e:
+        checked.append((None, (e.message, e.code)))
+    return checked
+
+
+def loadProgram(source, jobs=1):
+    """
+    loads XML with the program and returns list of its instructions sorted by order
+    """
+    tree = XMLTree(source, jobs)
+    tree.checkValidity()
+
+    # check order of instructions and put them into a list indexed by instruction pointer
+    program = []
+    for i in range(1, len(tree.instructions)+1):
+        if i not in tree.instructions:
+            sys.stderr.write('Error in the order of instructions.\n')
+            sys.exit(32)
+        program.append(tree.instructions[i])
+    return program
+
+
+def validCacheEntry(entry):
+    """
+    checks that an instruction loaded from the cache has the structure made by Instruction.toCache
+    """
+    return (isinstance(entry, list) and len(entry) == 7 and all(isinstance(field, str) for field in entry)
+            and entry[0] in opcodeNumbers
+            and all(type in ('', 'var', 'label', 'type') or type in constantPatterns for type in entry[1::2]))
+
+
+class ProgramCache:
+    """
+    keeps checked programs on disk (like __pycache__), so the same source doesn't have to be parsed and checked again
+    instructions are saved as JSON lists of strings (not pickle, anybody who can write to the directory could run
+    code by a pickle), files are named by hash of the source (and of this script),
+    the least recently used ones are removed
+    when the cache is bigger than maxSize bytes
+    """
+    def __init__(self, directory, maxSize):
+        self.directory = directory
+        self.maxSize = maxSize
+
+    def key(self, stream):
+        """
+        returns hash of the source read from the stream
+        """
+        hash = hashlib.sha256()
+        with open(__file__, 'rb') as script:
+            hash.update(script.read())
+        for block in iter(lambda: stream.read(65536), b''):
+            hash.update(block)
+        return hash.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def load(self, key):
+        """
+        returns the cached program or None if it isn't in the cache
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if not isinstance(data, list) or not all(validCacheEntry(entry) for entry in data):
+                raise ValueError('Damaged cache file.')
+            program = [Instruction.fromCache(tuple(entry)) for entry in data]
+            # the file was used right now (for LRU)
+            os.utime(path)
+            return program
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # damaged or incompatible file is just thrown away
             try:
-                int(order)
-            except ValueError:
-                sys.stderr.write('The order has to be integer.\n')
-                sys.exit(32)
-
-            # arg1, arg2, arg3
-            i = 1
-            arg1 = ''
-            arg1Val = ''
-            arg2 = ''
-            arg2Val = ''
-            arg3 = ''
-            arg3Val = ''
-            args_check = [0, 0, 0]
-            for childOfChild in child:
-            	for childOfChildOfChild in childOfChild:
-            		sys.stderr.write('The <arg> element can\'t have childs.\n')
-            		sys.exit(32)
-            	try:
-            		type = childOfChild.attrib['type']
-            	except KeyError:
-                    sys.stderr.write('The <arg> element needs attribute type.\n')
-                    sys.exit(32)
-            	if childOfChild.tag == 'arg1':
-                    arg1 = type
-                    arg1Val = str(childOfChild.text)
-                    if args_check[0] == 0:
-                        args_check[0] = 1
-                    else:
-                        sys.stderr.write('<arg1> is duplicit.\n')
-                        sys.exit(32)
-            	elif childOfChild.tag == 'arg2':
-                    arg2 = type
-                    arg2Val = str(childOfChild.text)
-                    if args_check[1] == 0:
-                        args_check[1] = 1
-                    else:
-                        sys.stderr.write('<arg2> is duplicit.\n')
-                        sys.exit(32)
-            	elif childOfChild.tag == 'arg3':
-                    arg3 = type
-                    arg3Val = str(childOfChild.text)
-                    if args_check[2] == 0:
-                        args_check[2] = 1
-                    else:
-                        sys.stderr.write('<arg3> is duplicit.\n')
-                        sys.exit(32)
-            	else:
-                    sys.stderr.write('Only <arg1>, <arg2> and <arg3> are allowed.\n')
-                    sys.exit(32)
-            	i += 1
-
-            # check if args are okay
-            if args_check[1] == 0 and args_check[2] == 1:
-                sys.stderr.write('You can\'t use <arg3> without <arg2>.\n')
-                sys.exit(32)
-            elif args_check[0] == 0 and args_check[1] == 1:
-                sys.stderr.write('You can\'t use <arg2> and without <arg1>.\n')
-                sys.exit(32)
-
-            # create a new Instruction
-            ins = Instruction(opcode, arg1, arg1Val, arg2, arg2Val, arg3, arg3Val)
-            ins.checkOpcode()
-            ins.checkCorrectArgs()
-
-            instructionTree[order] = ins
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def store(self, key, program):
+        """
+        saves the program to the cache, problems with the cache (e.g. read-only directory) are ignored
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmpPath = self._path(key) + '.' + str(os.getpid()) + '.tmp'
+            with open(tmpPath, 'w', encoding='utf-8') as file:
+                json.dump([ins.toCache() for ins in program], file)
+            os.replace(tmpPath, self._path(key))
+            self._evict()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """
+        removes the least recently used programs until the cache fits into maxSize
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+                total += info.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
 
 class Frame:
     """
     defines frame and takes care of variables (creating, getting and setting value, ...)
+    variables are stored in slots, names maps names of variables to slots (shared by all frames of the same kind)
+    values are stored as Python objects (int, bool, str or nil), None means uninitialised variable
     """
-    def __init__(self):
-        self.vars = {}
+    def __init__(self, names):
+        self.names = names
+        self.slots = [undefined] * len(names)
 
-    def variableExists(self, name):
-        if name in self.vars:
-            return True
-        else:
-            return False
+    def variableExists(self, slot):
+        return self.slots[slot] is not undefined
 
-    def variableInitialised(self, name):
-        if self.vars[name][0] is None or self.vars[name][0] == 'None':
-            return False
-        else:
-            return True
-
-    def createVar(self, name):
-        self.vars[name] = (None, 'nil')
+    def variableInitialised(self, slot):
+        return self.slots[slot] is not None
 
-    def getVal(self, name):
-        return self.vars[name][0]
+    def createVar(self, slot):
+        self.slots[slot] = None
 
-    def setVal(self, name, value, type):
-        self.vars[name] = (value, type)
+    def getVal(self, slot):
+        return self.slots[slot]
 
-    def getType(self, name):
-    	return self.vars[name][1]
+    def setVal(self, slot, value):
+        self.slots[slot] = value
 
     def __str__(self):
         text = ''
-        for i in self.vars:
-            text = text + str(i) + ': ' + str(self.vars[i][0]) + '\n'
+        for name, slot in self.names.items():
+            if self.slots[slot] is None:
+                text = text + name + ': None\n'
+            elif self.slots[slot] is not undefined:
+                text = text + name + ': ' + valueToLiteral(self.slots[slot]) + '\n'
         return text
 
 
-# maintain arguments
-parser = MyParser(add_help=False)
+class CountedFrame(Frame):
+    """
+    frame which counts its initialised variables, used only for statistics of variables (--vars)
+    """
+    def __init__(self, names, statistics):
+        Frame.__init__(self, names)
+        self.initialised = 0
+        self.statistics = statistics
 
-parser.add_argument('--help', '-help', action='store_true')
-parser.add_argument('--source', '-source')
-parser.add_argument('--input', '-input')
-parser.add_argument('--stati', '-stati')
-parser.add_argument('--insts', '-insts', action='store_true')
-parser.add_argument('--vars', '-vars', action='store_true')
+    def setVal(self, slot, value):
+        if self.slots[slot] is None:
+            self.initialised += 1
+            self.statistics.addVar()
+        self.slots[slot] = value
 
-arguments = parser.parse_args()
 
-if arguments.help:
-    if len(sys.argv) != 2:
-        sys.stderr.write('It seems you used wrong parameters. You can\'t use --help with other parameters.\n')
-        sys.exit(10)
-    print('********************************************************************************\n' +
-         '** Run script:                                                                **\n' +
-         '** 1. with parameter --help (shows help)                                      **\n' +
-         '** 2. with parameter --source or --input (you can use both, source is for     **\n' +
-         '**    source code and input can contain user\'s input                          **\n' +
-         '** 3. with parameter --stati=file and --insts|--vars                          **\n' +
-         '**    (saves statistics into file)                                            **\n' +
-         '**                                                                            **\n' +
-         '** It is NECESSARY to use either --source or --input! The other one           **\n' +
-         '** is loaded from stdin.                                                      **\n' +
-         '**                                                                            **\n' +
-         '** Examples:                                                                  **\n' +
-         '** python3.6 interpret.py --source=file1 --input=file2 --stati --inst         **\n' +
-         '** python3.6 interpret.py --help                                              **\n' +
-         '** python3.6 interpret.py --input=file2                                       **\n' +
-         '********************************************************************************\n')
-elif arguments.source or arguments.input:
-    if (arguments.source and arguments.source == '' and (not arguments.input or arguments.input == '')) or (arguments.input and arguments.input == '' and (not arguments.source or arguments.source == '')):
-        sys.stderr.write('You have to specify either input file or source file or both.\n')
-        sys.exit(10)
-    if arguments.stati and not arguments.input == '' and not (arguments.insts or arguments.vars):
-        sys.stderr.write('You have to specify what statistics you need.\n')
-        sys.exit(10)
+class VarsStatistics:
+    """
+    keeps number of initialised variables in all accessible frames (GF, TF and the top LF) and its maximum
+    """
+    def __init__(self):
+        self.current = 0
+        self.maximum = 0
+
+    def addVar(self):
+        self.current += 1
+        if self.current > self.maximum:
+            self.maximum = self.current
+
+    def framesChanged(self, frames):
+        """
+        recounts initialised variables when accessible frames change (createframe, pushframe, popframe)
+        """
+        self.current = 0
+        for frame in frames:
+            if frame is not None:
+                self.current += frame.initialised
+
 
-    insts = 0
-    vars = 0
+class Profiler:
+    """
+    counts executions and wall time of instructions (--profile), sums them by opcodes and by functions
+    (instructions executed after a call of a label up to the return belong to the function of that label)
+    """
+    mainFunction = '<main>'
+
+    def __init__(self, program, callsStack):
+        self.program = program
+        self.callsStack = callsStack
+        self.counts = [0] * len(program)
+        self.times = [0.0] * len(program)
+        self.functions = {}
+
+    def currentFunction(self):
+        """
+        returns the label called last, return addresses on the calls stack are right after the calls
+        """
+        if self.callsStack:
+            return self.program[self.callsStack[-1] - 1].arg1Val
+        return Profiler.mainFunction
 
-    # run the program!
-    if arguments.source:
+    def record(self, instructionPointer, function, time):
+        """
+        adds one execution of the instruction which was executed in function and took time seconds
+        """
+        self.counts[instructionPointer] += 1
+        self.times[instructionPointer] += time
+        statistics = self.functions.get(function)
+        if statistics is None:
+            statistics = self.functions[function] = {'calls': 0, 'count': 0, 'time': 0.0}
+        statistics['count'] += 1
+        statistics['time'] += time
+        ins = self.program[instructionPointer]
+        if ins.opcode == 'call':
+            called = self.functions.get(ins.arg1Val)
+            if called is None:
+                called = self.functions[ins.arg1Val] = {'calls': 0, 'count': 0, 'time': 0.0}
+            called['calls'] += 1
+
+    def results(self):
+        """
+        returns the profile as a dictionary (saved as JSON)
+        """
+        instructions = []
+        opcodes = {}
+        for instructionPointer, count in enumerate(self.counts):
+            if count:
+                opcode = self.program[instructionPointer].opcode.upper()
+                time = self.times[instructionPointer]
+                instructions.append({'order': instructionPointer + 1, 'opcode': opcode, 'count': count, 'time': time})
+                statistics = opcodes.setdefault(opcode, {'count': 0, 'time': 0.0})
+                statistics['count'] += count
+                statistics['time'] += time
+        return {
+            'total': {'count': sum(self.counts), 'time': sum(self.times)},
+            'instructions': instructions,
+            'opcodes': opcodes,
+            'functions': self.functions
+        }
+
+    def report(self, results):
+        """
+        returns the profile as a text with tables sorted by time
+        """
+        total = results['total']['time'] or 1.0
+        lines = ['Executed instructions: %d, time: %.6f s' % (results['total']['count'], results['total']['time'])]
+
+        lines.append('\nFunctions:')
+        lines.append('%-30s %10s %12s %12s %7s' % ('label', 'calls', 'count', 'time [s]', '%'))
+        for name, statistics in sorted(results['functions'].items(), key=lambda item: -item[1]['time']):
+            lines.append('%-30s %10d %12d %12.6f %6.2f%%' % (name, statistics['calls'], statistics['count'],
+                                                             statistics['time'], 100 * statistics['time'] / total))
+
+        lines.append('\nOpcodes:')
+        lines.append('%-30s %10s %12s %12s %7s' % ('opcode', '', 'count', 'time [s]', '%'))
+        for opcode, statistics in sorted(results['opcodes'].items(), key=lambda item: -item[1]['time']):
+            lines.append('%-30s %10s %12d %12.6f %6.2f%%' % (opcode, '', statistics['count'],
+                                                             statistics['time'], 100 * statistics['time'] / total))
+
+        lines.append('\nInstructions:')
+        lines.append('%-30s %10s %12s %12s %7s' % ('opcode', 'order', 'count', 'time [s]', '%'))
+        for statistics in sorted(results['instructions'], key=lambda item: -item['time']):
+            lines.append('%-30s %10d %12d %12.6f %6.2f%%' % (statistics['opcode'], statistics['order'], statistics['count'],
+                                                             statistics['time'], 100 * statistics['time'] / total))
+        return '\n'.join(lines) + '\n'
+
+    def save(self, fileName):
+        """
+        saves the profile as JSON to fileName and the text report to fileName.txt
+        """
+        results = self.results()
         try:
-            tree = ET.parse(arguments.source)
-        except FileNotFoundError:
-            sys.stderr.write('Can\'t open the file.\n')
-            sys.exit(11)
-        except Exception:
-            sys.stderr.write('Your XML is not well-formed.\n')
-            sys.exit(31)
-    else:
-        tree = ET.parse(sys.stdin)
+            with open(fileName, 'w') as file:
+                json.dump(results, file, indent=1)
+            with open(fileName + '.txt', 'w') as file:
+                file.write(self.report(results))
+        except IOError:
+            sys.stderr.write('File for profile can\'t be opened!\n')
+            sys.exit(12)
 
-    myTree = XMLTree(tree)
-    myTree.checkValidity()
 
-    # check order of instructions
-    for i in range(1, len(instructionTree)+1):
-        if str(i) not in instructionTree:
-            sys.stderr.write('Error in the order of instructions.\n')
-            sys.exit(32)
+class SampleProfiler:
+    """
+    periodically samples the executed instruction and the calls stack (--sample-profile), the main loop
+    isn't slowed down because sampling is done by a timer signal (or by a thread if there are no timers)
+    """
+    def __init__(self, program, snapshot, interval):
+        self.program = program
+        # function returning the instruction pointer and the calls stack
+        self.snapshot = snapshot
+        self.interval = interval
+        self.samples = {}
+        self.thread = None
+        self.stopped = None
+
+    def sample(self, *args):
+        instructionPointer, callsStack = self.snapshot()
+        key = (tuple(callsStack), instructionPointer)
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def _sampleThread(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self.stopped = threading.Event()
+            self.thread = threading.Thread(target=self._sampleThread, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        else:
+            self.stopped.set()
+            self.thread.join()
+
+    def _frameName(self, instructionPointer):
+        if instructionPointer < len(self.program):
+            return self.program[instructionPointer].opcode.upper() + ':' + str(instructionPointer + 1)
+        return '<end>'
+
+    def collapsedStacks(self):
+        """
+        returns samples in the collapsed stack format (main;label;...;OPCODE:order count) for flame graphs
+        """
+        stacks = {}
+        for (callsStack, instructionPointer), count in self.samples.items():
+            frames = [Profiler.mainFunction]
+            frames.extend(self.program[returnAddress - 1].arg1Val for returnAddress in callsStack)
+            frames.append(self._frameName(instructionPointer))
+            stack = ';'.join(frames)
+            stacks[stack] = stacks.get(stack, 0) + count
+        return ''.join(stack + ' ' + str(count) + '\n' for stack, count in sorted(stacks.items()))
+
+    def save(self, fileName):
+        try:
+            with open(fileName, 'w') as file:
+                file.write(self.collapsedStacks())
+        except IOError:
+            sys.stderr.write('File for profile can\'t be opened!\n')
+            sys.exit(12)
+
+
+class OutputBuffer:
+    """
+    collects output of the program and writes it to the stream in blocks of given size
+    size 0 means that every write goes directly to the stream, lineBuffered flushes after each new line
+    """
+    def __init__(self, stream, size=65536, lineBuffered=False):
+        self.stream = stream
+        self.size = size
+        self.lineBuffered = lineBuffered
+        self.parts = []
+        self.length = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length >= self.size or (self.lineBuffered and '\n' in text):
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.length = 0
+        self.stream.flush()
+
+
+class InputReader:
+    """
+    reads input of read instructions line by line, so only the current line is kept in memory
+    with useMmap the file is mapped to memory, if it isn't possible (empty file, pipe, ...), it is read as usual
+    """
+    def __init__(self, stream, useMmap=False):
+        self.stream = stream
+        self.map = None
+        if useMmap:
+            try:
+                self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                self.map = None
+
+    def readLine(self):
+        """
+        returns the next line without end of line, None at the end of input
+        """
+        try:
+            if self.map is not None:
+                return self._readMappedLine()
+            line = self.stream.readline()
+        except KeyboardInterrupt:
+            return None
+        if line == '':
+            return None
+        if line.endswith('\n'):
+            line = line[:-1]
+        return line
+
+    def _readMappedLine(self):
+        """
+        returns the next line of the mapped file like readLine, lines end by \n, \r\n or \r (universal newlines
+        like in a file opened as text)
+        """
+        start = self.map.tell()
+        if start >= len(self.map):
+            return None
+        end = self.map.find(b'\n', start)
+        if end == -1:
+            end = len(self.map)
+        nextStart = end + 1
+        carriageReturn = self.map.find(b'\r', start, end)
+        if carriageReturn != -1:
+            if carriageReturn + 1 != end:
+                # a lone \r ends the line
+                nextStart = carriageReturn + 1
+            end = carriageReturn
+        line = self.map[start:end].decode('utf-8')
+        self.map.seek(min(nextStart, len(self.map)))
+        return line
+
+    def close(self):
+        """
+        releases the mapped file, the stream is closed by the one who opened it
+        """
+        if self.map is not None:
+            self.map.close()
+
+
+class Interpreter:
+    """
+    interprets IPPcode19 programs, the program is loaded (checked and compiled) once and then it can be run
+    many times, each run has its own frames, stacks, input and output
+    errors and the exit instruction end the run by SystemExit with the exit code (as they end the script)
+    a run can be limited by the number of executed instructions (maxInsts), by time in seconds (timeout)
+    and by memory of the process in bytes (maxMemory)
+    with fuse frequent sequences of instructions are run as superinstructions (one dispatch for the whole sequence),
+    with optimize instructions which do nothing are run together with the next instruction which does something,
+    with inferTypes instructions with operands of known types are run by handlers which don't check them,
+    with backend 'pycompile' basic blocks of the program are translated to Python functions (see _compileProgram)
+    """
+    # limits are checked only after this number of executed instructions
+    checkInterval = 1024
+
+    def __init__(self, countVars=False, profile=None, sampleProfile=None, sampleInterval=0.001,
+                 bufferSize=65536, lineBuffered=False, inputMmap=False, maxInsts=None, timeout=None, maxMemory=None,
+                 fuse=False, optimize=False, inferTypes=False, backend='interpreter'):
+        self.countVars = countVars
+        self.profile = profile
+        self.sampleProfile = sampleProfile
+        self.sampleInterval = sampleInterval
+        self.bufferSize = bufferSize
+        self.lineBuffered = lineBuffered
+        self.inputMmap = inputMmap
+        self.maxInsts = maxInsts
+        self.timeout = timeout
+        self.maxMemory = maxMemory
+        self.fuse = fuse
+        self.optimize = optimize
+        self.inferTypes = inferTypes
+        self.backend = backend
+        self.program = []
+        # program run by the main loop, superinstructions replace sequences of program when fuse or optimize is used,
+        # instructions specialised by inferTypes replace the original ones
+        self.fusedProgram = []
+        # instructions left out by optimize, list of (instruction pointer, reason)
+        self.optimizations = []
+        # with backend pycompile the function making functions of basic blocks for a run and lengths of blocks
+        # by their first instruction pointers, None if the program is interpreted
+        self.compiledProgram = None
+        self.compiledLengths = []
+        # slots of variables, GF has its own, LF and TF share them because TF becomes LF after pushframe
+        self.globalSlots = {}
+        self.localSlots = {}
+        # number of executed instructions and statistics of variables of the last run
+        self.insts = 0
+        self.varsStatistics = None
+
+        handlers = {
+            'move': self._execMove,
+            'createframe': self._execCreateframe,
+            'pushframe': self._execPushframe,
+            'popframe': self._execPopframe,
+            'defvar': self._execDefvar,
+            'call': self._execCall,
+            'return': self._execReturn,
+            'pushs': self._execPushs,
+            'pops': self._execPops,
+            'add': self._execAdd,
+            'sub': self._execSub,
+            'mul': self._execMul,
+            'idiv': self._execIdiv,
+            'lt': self._execLt,
+            'gt': self._execGt,
+            'eq': self._execEq,
+            'and': self._execAnd,
+            'or': self._execOr,
+            'not': self._execNot,
+            'int2char': self._execInt2char,
+            'stri2int': self._execStri2int,
+            'read': self._execRead,
+            'write': self._execWrite,
+            'concat': self._execConcat,
+            'strlen': self._execStrlen,
+            'getchar': self._execGetchar,
+            'setchar': self._execSetchar,
+            'type': self._execType,
+            'label': self._execLabel,
+            'jump': self._execJump,
+            'jumpifeq': self._execJumpifeq,
+            'jumpifneq': self._execJumpifneq,
+            'exit': self._execExit,
+            'dprint': self._execDprint,
+            'break': self._execBreak
+        }
+        # dispatch table indexed by opcode numbers, instructions without a handler (div, ...) fail at runtime
+        self.dispatchTable = [handlers.get(opcode, self._execUnsupported) for opcode in opcodes]
+
+    def load(self, source, jobs=1, cache=None):
+        """
+        loads the program from source (name of a file or binary stream), checks it and compiles it
+        with cache (ProgramCache) the checked program is taken from the cache or saved to it
+        """
+        if cache is None:
+            program = loadProgram(source, jobs)
+        else:
+            if isinstance(source, str):
+                try:
+                    with open(source, 'rb') as sourceFile:
+                        key = cache.key(sourceFile)
+                except IOError:
+                    sys.stderr.write('Can\'t open the file.\n')
+                    sys.exit(11)
+            else:
+                # stream can be read only once
+                source = io.BytesIO(source.read())
+                key = cache.key(source)
+                source.seek(0)
+            program = cache.load(key)
+            if program is None:
+                program = loadProgram(source, jobs)
+                cache.store(key, program)
+        self.loadInstructions(program)
+
+    def loadInstructions(self, program):
+        """
+        uses already checked instructions (list sorted by order) as the program, finds labels and compiles it
+        """
+        # at first find all labels and save them
+        labels = {}
+        for instructionPointer in range(len(program)):
+            if program[instructionPointer].opcode == 'label':
+                # save the label for future
+                if program[instructionPointer].arg1Val in labels:
+                    sys.stderr.write('Error in instruction ' + str(instructionPointer + 1) + ': This label already exists.\n')
+                    sys.exit(52)
+                else:
+                    labels[program[instructionPointer].arg1Val] = instructionPointer
+
+        # compile instructions (opcode numbers, split variables, resolved labels)
+        self.globalSlots = {}
+        self.localSlots = {}
+        for ins in program:
+            ins.compile(labels, self.globalSlots, self.localSlots)
+        self.program = program
+        # handlers of superinstructions of the previous program are thrown away
+        self.dispatchTable = self.dispatchTable[:len(opcodes)]
+        typedProgram = self._specialiseInstructions(program) if self.inferTypes else program
+        self.fusedProgram = typedProgram
+        if self.fuse:
+            self.fusedProgram = self._fuseInstructions(typedProgram)
+        if self.optimize:
+            self.fusedProgram = self._optimizeInstructions(typedProgram, self.fusedProgram)
+        self.compiledProgram = None
+        if self.backend == 'pycompile':
+            self.compiledProgram, self.compiledLengths = self._compileProgram(program)
+
+    def _specialiseInstructions(self, program):
+        """
+        returns the program where instructions whose operands have types known by inferTypes are replaced by copies
+        with their own handlers, these don't check frames, variables and types, only values (division by zero, ...)
+        """
+        typed = list(program)
+        for instructionPointer, types in inferTypes(program, reachableInstructions(program)).items():
+            handler = self._typedHandler(program[instructionPointer], types)
+            if handler is not None:
+                typed[instructionPointer] = copy.copy(program[instructionPointer])
+                typed[instructionPointer].code = len(self.dispatchTable)
+                self.dispatchTable.append(handler)
+        return typed
+
+    def _compileProgram(self, program):
+        """
+        translates reachable basic blocks of the program to Python source (see _compileBlock) and compiles it,
+        returns the function making functions of the blocks for a run and lengths of the blocks,
+        (None, []) if Python can't compile it (e.g. too big program), the program is interpreted then
+        """
+        reachable = reachableInstructions(program)
+        types = inferTypes(program, reachable)
+        lines = ['def build(self, handlers, program, nil, concat, replace, exit):',
+                 '    G = self.globalFrame.slots',
+                 '    GF = self.globalFrame',
+                 '    S = self.stack',
+                 '    blocks = [None] * ' + str(len(program))]
+        lengths = [0] * len(program)
+        for start, block in sorted(basicBlocks(program, reachable).items()):
+            lines.append('    def block' + str(start) + '():')
+            lines.extend('        ' + line for line in self._compileBlock(program, block, types))
+            lines.append('    blocks[' + str(start) + '] = block' + str(start))
+            lengths[start] = len(block)
+        lines.append('    return blocks')
+        namespace = {}
+        try:
+            exec(compile('\n'.join(lines) + '\n', '<IPPcode19>', 'exec'), namespace)
+        except (SyntaxError, RecursionError, MemoryError, ValueError, OverflowError):
+            return None, []
+        return namespace['build'], lengths
+
+    def _compileBlock(self, program, block, types):
+        """
+        returns lines of the body of the Python function which runs the basic block and returns the next instruction
+        pointer, instructions with operands of known types (see typedInstruction) become Python statements,
+        the others call their handlers, instructions which can fail set self.instructionPointer first
+        GF variables of the statements are kept in local variables of the function and written back to GF before
+        handlers and before the function returns (not with statistics of variables, setVal counts them)
+        """
+        lines = []
+        # GF slots which are in local variables and those of them which have been changed
+        cached = set()
+        changed = set()
+
+        def flush():
+            for slot in sorted(changed):
+                lines.append('G[' + str(slot) + '] = g' + str(slot))
+            changed.clear()
+
+        def value(operand):
+            if operand[0] != 'var':
+                return repr(operand[1])
+            slot = str(operand[3])
+            if operand[2] == 'GF':
+                if self.countVars:
+                    return 'G[' + slot + ']'
+                if operand[3] not in cached:
+                    lines.append('g' + slot + ' = G[' + slot + ']')
+                    cached.add(operand[3])
+                return 'g' + slot
+            if operand[2] == 'LF':
+                return 'S[-1].slots[' + slot + ']'
+            return 'self.temporaryFrame.slots[' + slot + ']'
+
+        def store(operand, expression):
+            slot = str(operand[3])
+            frame = {'GF': 'GF', 'LF': 'S[-1]', 'TF': 'self.temporaryFrame'}[operand[2]]
+            if self.countVars:
+                lines.append(frame + '.setVal(' + slot + ', ' + expression + ')')
+            elif operand[2] == 'GF':
+                lines.append('g' + slot + ' = ' + expression)
+                cached.add(operand[3])
+                changed.add(operand[3])
+            else:
+                lines.append(frame + '.slots[' + slot + '] = ' + expression)
+
+        def fail(instructionPointer, message, code):
+            lines.append('    self.errorOutput.write(' + repr('Error in instruction ' + str(instructionPointer + 1) + message) + ')')
+            lines.append('    exit(' + str(code) + ')')
+
+        for instructionPointer in block:
+            ins = program[instructionPointer]
+            opcode = ins.opcode
+            operandTypes = types.get(instructionPointer)
+            if opcode == 'label':
+                continue
+            if opcode == 'jump' and ins.target is not None:
+                flush()
+                lines.append('return ' + str(ins.target))
+                return lines
+            if operandTypes is None or not typedInstruction(ins, operandTypes):
+                # handlers may use all variables
+                flush()
+                cached.clear()
+                lines.append('self.instructionPointer = ' + str(instructionPointer))
+                call = 'handlers[' + str(instructionPointer) + '](program[' + str(instructionPointer) + '])'
+                if opcode in jumpingOpcodes:
+                    lines.append('target = ' + call)
+                    lines.append('return ' + str(instructionPointer + 1) + ' if target is None else target')
+                    return lines
+                lines.append(call)
+                continue
+
+            symbs = [value(operand) for operand in ins.operands[1:]]
+            if opcode in ('jumpifeq', 'jumpifneq'):
+                flush()
+                lines.append('if ' + symbs[0] + (' == ' if opcode == 'jumpifeq' else ' != ') + symbs[1] + ':')
+                lines.append('    return ' + str(ins.target))
+                lines.append('return ' + str(instructionPointer + 1))
+                return lines
+            if opcode in binaryOperators:
+                expression = '(' + symbs[0] + ' ' + binaryOperators[opcode] + ' ' + symbs[1] + ')'
+                if opcode == 'eq' and operandTypes[1] != operandTypes[2]:
+                    # nil and a value of another type
+                    expression = 'False'
+            elif opcode == 'move':
+                expression = symbs[0]
+            elif opcode == 'not':
+                expression = '(not ' + symbs[0] + ')'
+            elif opcode == 'strlen':
+                expression = 'len(' + symbs[0] + ')'
+            elif opcode == 'concat':
+                # concat can run out of memory
+                lines.append('self.instructionPointer = ' + str(instructionPointer))
+                expression = 'concat(' + symbs[0] + ', ' + symbs[1] + ')'
+            elif opcode == 'idiv':
+                lines.append('self.instructionPointer = ' + str(instructionPointer))
+                lines.append('divisor = ' + symbs[1])
+                lines.append('if divisor == 0:')
+                fail(instructionPointer, ': Division by zero.\n', 57)
+                expression = 'int(round(' + symbs[0] + ' / divisor))'
+            elif opcode == 'int2char':
+                lines.append('self.instructionPointer = ' + str(instructionPointer))
+                lines.append('try:')
+                lines.append('    char = chr(' + symbs[0] + ')')
+                lines.append('except (ValueError, OverflowError):')
+                fail(instructionPointer, ': Int2char index out of range.\n', 58)
+                expression = 'char'
+            else:
+                # getchar, stri2int and setchar
+                lines.append('self.instructionPointer = ' + str(instructionPointer))
+                if opcode == 'setchar':
+                    symbs.insert(0, value(ins.operands[0]))
+                lines.append('string = ' + symbs[0])
+                lines.append('index = ' + symbs[1])
+                lines.append('if index < 0 or index >= len(string):')
+                fail(instructionPointer, ': ' + opcode.capitalize() + ' index out of range.\n', 58)
+                if opcode == 'setchar':
+                    lines.append('char = ' + symbs[2])
+                    lines.append("if char == '':")
+                    fail(instructionPointer, ': Symb2 is empty.\n', 58)
+                    expression = 'replace(string, index, char[0])'
+                else:
+                    expression = 'string[index]' if opcode == 'getchar' else 'ord(string[index])'
+            store(ins.operands[0], expression)
+
+        flush()
+        lines.append('return ' + str(block[-1] + 1))
+        return lines
+
+    def _valueReader(self, operand):
+        """
+        returns a function returning value of a constant or of a variable which surely exists and is initialised
+        """
+        value = operand[1]
+        slot = operand[3]
+        if operand[0] != 'var':
+            return lambda: value
+        if operand[2] == 'GF':
+            return lambda: self.globalFrame.slots[slot]
+        if operand[2] == 'LF':
+            return lambda: self.stack[-1].slots[slot]
+        return lambda: self.temporaryFrame.slots[slot]
+
+    def _valueWriter(self, operand):
+        """
+        returns a function setting a variable which surely exists
+        """
+        slot = operand[3]
+        if operand[2] == 'GF':
+            return lambda value: self.globalFrame.setVal(slot, value)
+        if operand[2] == 'LF':
+            return lambda value: self.stack[-1].setVal(slot, value)
+        return lambda value: self.temporaryFrame.setVal(slot, value)
+
+    def _typedHandler(self, ins, types):
+        """
+        returns the handler of the instruction specialised for known types of its operands,
+        None if a check could fail (see typedInstruction)
+        """
+        if not typedInstruction(ins, types):
+            return None
+        opcode = ins.opcode
+
+        readers = [self._valueReader(operand) for operand in ins.operands[1:]]
+        if opcode in ('jumpifeq', 'jumpifneq'):
+            read1, read2 = readers
+            target = ins.target
+            equal = opcode == 'jumpifeq'
+
+            def execute(ins):
+                if (read1() == read2()) == equal:
+                    return target
+            return execute
+
+        write = self._valueWriter(ins.operands[0])
+        if opcode in ('move', 'not', 'strlen'):
+            read1, = readers
+            operation = {'move': None, 'not': operator.not_, 'strlen': len}[opcode]
+            if operation is None:
+                def execute(ins):
+                    write(read1())
+            else:
+                def execute(ins):
+                    write(operation(read1()))
+        elif opcode in ('add', 'sub', 'mul', 'lt', 'gt', 'eq', 'and', 'or', 'concat'):
+            read1, read2 = readers
+            operation = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul, 'lt': operator.lt,
+                         'gt': operator.gt, 'eq': operator.eq, 'and': lambda a, b: a and b, 'or': lambda a, b: a or b,
+                         'concat': Rope.concat}[opcode]
+            if opcode == 'eq' and types[1] != types[2]:
+                # nil and a value of another type
+                operation = lambda a, b: False
+
+            def execute(ins):
+                write(operation(read1(), read2()))
+        elif opcode == 'idiv':
+            read1, read2 = readers
+
+            def execute(ins):
+                value1 = read1()
+                value2 = read2()
+                if value2 == 0:
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Division by zero.\n')
+                    sys.exit(57)
+                write(int(round(value1 / value2)))
+        elif opcode in ('getchar', 'stri2int'):
+            read1, read2 = readers
+            message = ': Getchar index out of range.\n' if opcode == 'getchar' else ': Stri2int index out of range.\n'
+            operation = (lambda char: char) if opcode == 'getchar' else ord
+
+            def execute(ins):
+                string = read1()
+                index = read2()
+                if index < 0 or index >= len(string):
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + message)
+                    sys.exit(58)
+                write(operation(string[index]))
+        elif opcode == 'int2char':
+            read1, = readers
+
+            def execute(ins):
+                try:
+                    value = chr(read1())
+                except (ValueError, OverflowError):
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Int2char index out of range.\n')
+                    sys.exit(58)
+                write(value)
+        else:
+            readDest = self._valueReader(ins.operands[0])
+            read1, read2 = readers
+
+            def execute(ins):
+                string = readDest()
+                index = read1()
+                if index < 0 or index >= len(string):
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Setchar index out of range.\n')
+                    sys.exit(58)
+                char = read2()
+                if char == '':
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Symb2 is empty.\n')
+                    sys.exit(58)
+                write(Rope.replace(string, index, char[0]))
+        return execute
+
+    def _fuseInstructions(self, program):
+        """
+        returns the program with superinstructions in place of frequent sequences, their handlers are added
+        to the dispatch table, the parts stay in the program after the superinstruction, so they can be run one by one
+        """
+        fused = list(program)
+        instructionPointer = 0
+        while instructionPointer < len(program):
+            length = fusedLength(program, instructionPointer)
+            starts = [instructionPointer] if length > 1 else []
+            if length > 2 and program[instructionPointer].opcode == 'label':
+                # the sequence after the label is fused too, optimize leaves the label out and runs only the sequence
+                starts.append(instructionPointer + 1)
+            for start in starts:
+                end = start + fusedLength(program, start)
+                fused[start] = Superinstruction(program[start:end], range(start, end), len(self.dispatchTable))
+                self.dispatchTable.append(self._fusedHandler(start, program[start:end]))
+            instructionPointer = instructionPointer + length
+        return fused
+
+    def _optimizeInstructions(self, program, runProgram):
+        """
+        returns the program run by the main loop (runProgram, possibly with superinstructions of fuse) where each
+        instruction which only passes control further (label, jump, ...) is replaced by a superinstruction running
+        all of them up to the next instruction which does something, so chains of jumps are followed by one dispatch
+        instruction pointers don't change, so errors report the same orders and insts count the left out instructions too
+        """
+        reachable = reachableInstructions(program)
+        noops = findNoops(program, reachable)
+        usedLabels = {ins.arg1Val for ins in program if ins.opcode != 'label' and ins.arg1Type == 'label'}
+        self.optimizations = []
+        for instructionPointer, ins in enumerate(program):
+            if instructionPointer not in reachable:
+                self.optimizations.append((instructionPointer, 'unreachable'))
+            elif instructionPointer in noops:
+                reason = noops[instructionPointer][1]
+                if ins.opcode == 'label' and ins.arg1Val not in usedLabels:
+                    reason = 'unused label'
+                self.optimizations.append((instructionPointer, reason))
+
+        optimized = list(runProgram)
+        for start in noops:
+            pointers = []
+            instructionPointer = start
+            # the chain ends by an instruction which does something, by the end of the program or by a loop of no-ops
+            while instructionPointer in noops and instructionPointer not in pointers and len(pointers) < maxNoops:
+                pointers.append(instructionPointer)
+                instructionPointer = noops[instructionPointer][0]
+            parts = [program[i] for i in pointers]
+            kept = None
+            if instructionPointer < len(program) and instructionPointer not in noops:
+                kept = runProgram[instructionPointer]
+                keptPointers = range(instructionPointer, instructionPointer + kept.count)
+                if any(i in pointers for i in keptPointers):
+                    # a part of the superinstruction would be counted twice
+                    kept = program[instructionPointer]
+                    keptPointers = [instructionPointer]
+                parts = parts + (kept.parts if kept.count > 1 else [kept])
+                pointers = pointers + list(keptPointers)
+            optimized[start] = Superinstruction(parts, pointers, len(self.dispatchTable))
+            self.dispatchTable.append(self._noopsHandler(instructionPointer, kept))
+        return optimized
+
+    def _noopsHandler(self, instructionPointer, kept):
+        """
+        returns the handler of a superinstruction of no-ops, it runs only the instruction kept at instructionPointer
+        (an instruction or a superinstruction), without kept it continues at instructionPointer
+        """
+        if kept is None:
+            def execute(ins):
+                return instructionPointer
+            return execute
+        handler = self.dispatchTable[kept.code]
+        nextInstruction = instructionPointer + 1
+
+        def execute(ins):
+            self.instructionPointer = instructionPointer
+            jumpInstr = handler(kept)
+            return nextInstruction if jumpInstr is None else jumpInstr
+        return execute
+
+    def _fusedHandler(self, start, parts):
+        """
+        returns the handler of a superinstruction, it runs handlers of the parts (labels do nothing) as the main loop would,
+        so errors report the order of the part and call returns after the sequence
+        loop counters, pushs/pushs/pops and createframe/pushframe/call have specialised handlers, which use these
+        handlers only when the specialised code can't be used (an error or an unusual operand)
+        """
+        steps = [(start + i, self.dispatchTable[ins.code], ins) for i, ins in enumerate(parts) if ins.opcode != 'label']
+        end = start + len(parts)
+        # handlers are unrolled for sequences of one to three parts (labels aren't counted)
+        pointer1, handler1, part1 = steps[0]
+        if len(steps) == 1:
+            def execute(ins):
+                self.instructionPointer = pointer1
+                jumpInstr = handler1(part1)
+                return end if jumpInstr is None else jumpInstr
+            return execute
+        pointer2, handler2, part2 = steps[1]
+        if len(steps) == 2:
+            def execute(ins):
+                self.instructionPointer = pointer1
+                handler1(part1)
+                self.instructionPointer = pointer2
+                jumpInstr = handler2(part2)
+                return end if jumpInstr is None else jumpInstr
+            return execute
+        pointer3, handler3, part3 = steps[2]
+
+        def execute(ins):
+            self.instructionPointer = pointer1
+            handler1(part1)
+            self.instructionPointer = pointer2
+            handler2(part2)
+            self.instructionPointer = pointer3
+            jumpInstr = handler3(part3)
+            return end if jumpInstr is None else jumpInstr
+
+        sequence = (part1.opcode, part2.opcode, part3.opcode)
+        if sequence[0] in ('add', 'sub') and sequence[1] in ('lt', 'gt', 'eq') and sequence[2] in ('jumpifeq', 'jumpifneq'):
+            return self._fusedCounter(part1, part2, part3, pointer3, end, execute)
+        if sequence == ('pushs', 'pushs', 'pops'):
+            return self._fusedStackMove(part1, part2, part3, pointer3, end, execute)
+        if sequence == ('createframe', 'pushframe', 'call'):
+            return self._fusedFrameCall(part3, pointer3, end, execute)
+        return execute
+
+    def _fusedCounter(self, arithmetic, comparison, jump, pointer, end, execute):
+        """
+        returns the handler of add/sub, lt/gt/eq and jumpifeq/jumpifneq on the result of the comparison (a loop counter),
+        all operands are read at first, the variables are set and the jump is decided only if all of them are integers
+        """
+        dest, symb1, symb2 = arithmetic.operands
+        condition, symb3, symb4 = comparison.operands
+        label, symb5, symb6 = jump.operands
+        # the jump has to compare the result of the comparison with a bool constant
+        if symb6[0] == 'var':
+            symb5, symb6 = symb6, symb5
+        if symb5[0] != 'var' or symb5[2:] != condition[2:] or symb6[0] != 'bool' or condition[2:] == dest[2:]:
+            return execute
+        arithmeticOperator = operator.add if arithmetic.opcode == 'add' else operator.sub
+        comparisonOperator = {'lt': operator.lt, 'gt': operator.gt, 'eq': operator.eq}[comparison.opcode]
+        # the jump is taken if the result of the comparison is jumpIf
+        jumpIf = symb6[1] if jump.opcode == 'jumpifeq' else not symb6[1]
+        # operands of the comparison can be the result of the arithmetic instruction
+        destIs3 = symb3[0] == 'var' and symb3[2:] == dest[2:]
+        destIs4 = symb4[0] == 'var' and symb4[2:] == dest[2:]
+        peekFrame = self._peekFrame
+        peekValue = self._peekValue
+
+        def executeCounter(ins):
+            destFrame = peekFrame(dest[2])
+            conditionFrame = peekFrame(condition[2])
+            value1 = peekValue(symb1)
+            value2 = peekValue(symb2)
+            if (destFrame is None or conditionFrame is None or type(value1) is not int or type(value2) is not int
+                    or destFrame.slots[dest[3]] is undefined or conditionFrame.slots[condition[3]] is undefined
+                    or jump.target is None):
+                return execute(ins)
+            result = arithmeticOperator(value1, value2)
+            value3 = result if destIs3 else peekValue(symb3)
+            value4 = result if destIs4 else peekValue(symb4)
+            if type(value3) is not int or type(value4) is not int:
+                return execute(ins)
+            destFrame.setVal(dest[3], result)
+            compared = comparisonOperator(value3, value4)
+            conditionFrame.setVal(condition[3], compared)
+            self.instructionPointer = pointer
+            if compared == jumpIf:
+                return jump.target
+            return end
+        return executeCounter
+
+    def _fusedStackMove(self, push1, push2, pop, pointer, end, execute):
+        """
+        returns the handler of pushs, pushs and pops, the first value stays on the stack and the second one is popped
+        """
+        symb1 = push1.operands[0]
+        symb2 = push2.operands[0]
+        dest = pop.operands[0]
+        peekFrame = self._peekFrame
+        peekValue = self._peekValue
+
+        def executeStackMove(ins):
+            value1 = peekValue(symb1)
+            value2 = peekValue(symb2)
+            destFrame = peekFrame(dest[2])
+            if value1 is None or value2 is None or destFrame is None or destFrame.slots[dest[3]] is undefined:
+                return execute(ins)
+            self.programStack.append(value1)
+            destFrame.setVal(dest[3], value2)
+            self.instructionPointer = pointer
+            return end
+        return executeStackMove
+
+    def _fusedFrameCall(self, call, pointer, end, execute):
+        """
+        returns the handler of createframe, pushframe and call, the new frame is pushed as LF straight away
+        """
+        def executeFrameCall(ins):
+            if call.target is None:
+                return execute(ins)
+            self.stack.append(self._createFrame(self.localSlots))
+            self.temporaryFrame = None
+            self._accessibleFramesChanged()
+            self.instructionPointer = pointer
+            self.callsStack.append(end)
+            return call.target
+        return executeFrameCall
+
+    def run(self, stdin=None, stdout=None, stderr=None):
+        """
+        runs the loaded program, read instructions read lines of stdin, write writes to stdout and dprint, break
+        and runtime errors write to stderr (sys.stdin, sys.stdout and sys.stderr are used by default)
+        """
+        # define GF, TF and stack for LFs
+        self.instructionPointer = 0
+        self.temporaryFrame = None
+        self.stack = []
+        self.callsStack = []
+        self.programStack = []
+        # variables are counted by frames only if the statistics is required
+        self.varsStatistics = VarsStatistics() if self.countVars else None
+        self.globalFrame = self._createFrame(self.globalSlots)
+        # input for read instructions
+        self.inputReader = InputReader(stdin if stdin is not None else sys.stdin, self.inputMmap)
+        # output of write and of dprint, break and runtime errors
+        self.output = OutputBuffer(stdout if stdout is not None else sys.stdout, self.bufferSize, self.lineBuffered)
+        self.errorOutput = OutputBuffer(stderr if stderr is not None else sys.stderr, self.bufferSize, self.lineBuffered)
+
+        # instructions are timed only if the profile is required
+        profiler = Profiler(self.program, self.callsStack) if self.profile else None
+        # sampling runs beside the main loop
+        sampleProfiler = None
+        if self.sampleProfile:
+            sampleProfiler = SampleProfiler(self.program, lambda: (self.instructionPointer, self.callsStack), self.sampleInterval)
+
+        program = self.program
+        # superinstructions and specialised instructions aren't profiled
+        runProgram = self.fusedProgram if profiler is None else program
+        programLength = len(program)
+        dispatchTable = self.dispatchTable
+        # functions of compiled basic blocks, the profilers need the interpreter
+        compiledBlocks = None
+        if self.compiledProgram is not None and profiler is None and sampleProfiler is None:
+            compiledBlocks = self.compiledProgram(self, [dispatchTable[ins.code] for ins in program], program, nil,
+                                                  Rope.concat, Rope.replace, sys.exit)
+        # length of the compiled block which is running
+        compiledLength = 0
+        # instruction pointer is an index to the program (order of the instruction minus one),
+        # it is kept in a local variable and handlers see it in self.instructionPointer
+        instructionPointer = 0
+        insts = 0
+        # limits are checked when insts reaches nextCheck (never without limits)
+        nextCheck = 1 if self.maxInsts is not None or self.timeout is not None or self.maxMemory is not None else 0
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
 
-    # start interpret
+        """
+        This is main loop. It loops through instructions in order defined by instruction pointer.
+        """
+        if sampleProfiler is not None:
+            sampleProfiler.start()
+        try:
+            if compiledBlocks is not None:
+                # the same loop with compiled blocks, each of them counts as its instructions, if limits should
+                # be checked inside a block, or the instruction isn't the first one of a block, it is interpreted
+                compiledLengths = self.compiledLengths
+                if not nextCheck:
+                    nextCheck = sys.maxsize
+                while instructionPointer < programLength:
+                    block = compiledBlocks[instructionPointer]
+                    if block is not None and insts+compiledLengths[instructionPointer] < nextCheck:
+                        self.instructionPointer = instructionPointer
+                        compiledLength = compiledLengths[instructionPointer]
+                        insts = insts+compiledLength
+                        instructionPointer = block()
+                        compiledLength = 0
+                        continue
+
+                    ins = program[instructionPointer]
+                    self.instructionPointer = instructionPointer
+
+                    insts = insts+1
+                    if insts == nextCheck:
+                        nextCheck = self._checkLimits(insts, deadline)
+
+                    jumpInstr = dispatchTable[ins.code](ins)
+
+                    if jumpInstr is not None:
+                        instructionPointer = jumpInstr
+                    else:
+                        instructionPointer = instructionPointer + 1
+            elif profiler is None and (self.fuse or self.optimize):
+                # the same loop with superinstructions, each of them counts as its parts,
+                # if limits should be checked inside a superinstruction, its parts are run one by one
+                if not nextCheck:
+                    nextCheck = sys.maxsize
+                while instructionPointer < programLength:
+                    ins = runProgram[instructionPointer]
+                    self.instructionPointer = instructionPointer
+
+                    insts = insts+ins.count
+                    if insts >= nextCheck:
+                        if ins.count > 1:
+                            insts = insts-ins.count+1
+                            ins = program[instructionPointer]
+                        if insts == nextCheck:
+                            nextCheck = self._checkLimits(insts, deadline)
+
+                    jumpInstr = dispatchTable[ins.code](ins)
+
+                    if jumpInstr is not None:
+                        instructionPointer = jumpInstr
+                    else:
+                        instructionPointer = instructionPointer + 1
+            elif profiler is None:
+                while instructionPointer < programLength:
+                    ins = runProgram[instructionPointer]
+                    self.instructionPointer = instructionPointer
 
-    # at first find all labels and save them
-    instructionPointer = 1
-    labels = {}
+                    insts = insts+1
+                    if insts == nextCheck:
+                        nextCheck = self._checkLimits(insts, deadline)
 
-    while instructionPointer <= len(instructionTree):
-        keyValue = str(instructionPointer)
-        if instructionTree[keyValue].opcode == 'label':
-            # save the label for future
-            if instructionTree[keyValue].arg1Val in labels:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This label already exists.\n')
-                sys.exit(52)
+                    jumpInstr = dispatchTable[ins.code](ins)
+
+                    # end of main while loop, check if there is jump instruction or increment instruction pointer
+                    if jumpInstr is not None:
+                        instructionPointer = jumpInstr
+                    else:
+                        instructionPointer = instructionPointer + 1
             else:
-                labels[instructionTree[keyValue].arg1Val] = keyValue
-        instructionPointer = instructionPointer+1
+                # the same loop measuring each instruction, the one which ends the program is measured too
+                while instructionPointer < programLength:
+                    ins = program[instructionPointer]
+                    self.instructionPointer = instructionPointer
 
-    # interpret instructions
+                    insts = insts+1
+                    if insts == nextCheck:
+                        nextCheck = self._checkLimits(insts, deadline)
 
-    instructionPointer = 1
-    # define GF, TF and stack for LFs
-    globalFrame = Frame()
-    temporaryFrame = None
-    localFrame = None
-    stack = []
-    callsStack = []
-    programStack = []
-    if arguments.input:
-        inputFile = open(arguments.input, 'r').read().split('\n')
-        filePosition = 0
+                    function = profiler.currentFunction()
+                    start = time.perf_counter()
+                    try:
+                        jumpInstr = dispatchTable[ins.code](ins)
+                    finally:
+                        profiler.record(instructionPointer, function, time.perf_counter() - start)
 
+                    if jumpInstr is not None:
+                        instructionPointer = jumpInstr
+                    else:
+                        instructionPointer = instructionPointer + 1
+        except MemoryError:
+            # e.g. a string doubled by concat in a loop, it can happen between checks of the memory limit too
+            self.programStack = []
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Out of memory.\n')
+            sys.exit(59)
+        finally:
+            if compiledLength:
+                # the run has ended inside a compiled block, its instructions after the current one haven't been executed
+                insts = insts-compiledLength+self.instructionPointer-instructionPointer+1
+                instructionPointer = self.instructionPointer
+            elif instructionPointer < programLength and ins.count > 1:
+                # the run has ended inside a superinstruction, its parts after the current one haven't been executed
+                insts = insts-ins.count+ins.executed.get(self.instructionPointer, ins.count)
+            self.instructionPointer = instructionPointer
+            self.insts = insts
+            # output is flushed at the end of the program, after exit instruction and after errors
+            self.output.flush()
+            self.errorOutput.flush()
+            self.inputReader.close()
+            if sampleProfiler is not None:
+                sampleProfiler.stop()
+                sampleProfiler.save(self.sampleProfile)
+            if profiler is not None:
+                profiler.save(self.profile)
 
     # functions for tasks needed during interpretation
-    def chooseFrame(frame):
+    def _checkLimits(self, insts, deadline):
+        """
+        ends the program if it has exceeded a limit, returns the number of instructions when to check again
+        """
+        if self.maxInsts is not None and insts > self.maxInsts:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': The limit of executed instructions has been exceeded.\n')
+            sys.exit(59)
+        if deadline is not None and time.monotonic() > deadline:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': The time limit has been exceeded.\n')
+            sys.exit(59)
+        if self.maxMemory is not None and memoryUsage() > self.maxMemory:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': The memory limit has been exceeded.\n')
+            sys.exit(59)
+        nextCheck = insts + Interpreter.checkInterval
+        if self.maxInsts is not None and self.maxInsts + 1 < nextCheck:
+            # the limit of instructions is exact
+            nextCheck = self.maxInsts + 1
+        return nextCheck
+
+    def _createFrame(self, names):
+        """
+        creates a new frame, counting one if statistics of variables is required
+        """
+        if self.varsStatistics is None:
+            return Frame(names)
+        return CountedFrame(names, self.varsStatistics)
+
+    def _accessibleFramesChanged(self):
+        """
+        updates statistics of variables after TF or LF has changed
+        """
+        if self.varsStatistics is not None:
+            self.varsStatistics.framesChanged((self.globalFrame, self.temporaryFrame, self.stack[-1] if self.stack else None))
+
+    def _chooseFrame(self, frame):
         """
         checks if is it possible to use a frame
         """
         f = None
         if frame == 'GF':
-            f = globalFrame
+            f = self.globalFrame
         elif frame == 'TF':
-            if temporaryFrame is None:
-                sys.stderr.write(
-                    'Error in instruction ' + keyValue + ': You\'ve tried to use undefined temporary frame.\n')
+            if self.temporaryFrame is None:
+                self.errorOutput.write(
+                    'Error in instruction ' + str(self.instructionPointer + 1) + ': You\'ve tried to use undefined temporary frame.\n')
                 sys.exit(55)
             else:
-                f = temporaryFrame
+                f = self.temporaryFrame
         elif frame == 'LF':
-            if not stack:
-                sys.stderr.write(
-                    'Error in instruction ' + keyValue + ': You\'ve tried to use undefined local frame.\n')
+            if not self.stack:
+                self.errorOutput.write(
+                    'Error in instruction ' + str(self.instructionPointer + 1) + ': You\'ve tried to use undefined local frame.\n')
                 sys.exit(55)
             else:
-                f = stack.pop()
-                # TODO: tady byl ten problem !!!
-                stack.append(f)
+                f = self.stack[-1]
         return f
 
-    def getTypeOfSymb(symb, order):
+    def _peekFrame(self, frame):
         """
-        returns dynamic type of symbol (variable or constant)
+        returns the frame like _chooseFrame, but None instead of an error (used by superinstructions)
         """
+        if frame == 'GF':
+            return self.globalFrame
+        if frame == 'TF':
+            return self.temporaryFrame
+        return self.stack[-1] if self.stack else None
 
-        if order == 1:
-
-       		if instructionTree[keyValue].arg1Type == 'var':
-        		frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-        		frameObject = chooseFrame(frame)
-        		return frameObject.getType(name)
-        	else:
-        		return instructionTree[keyValue].arg1Type
-        elif order == 2:
-        	if instructionTree[keyValue].arg2Type == 'var':
-	        	frame, at, name = instructionTree[keyValue].arg2Val.partition('@')
-	        	frameObject = chooseFrame(frame)
-	        	return frameObject.getType(name)
-	        else:
-	        	return instructionTree[keyValue].arg2Type
-        else:
-        	if instructionTree[keyValue].arg3Type == 'var':
-	        	frame, at, name = instructionTree[keyValue].arg3Val.partition('@')
-	        	frameObject = chooseFrame(frame)
-	        	return frameObject.getType(name)
-	        else:
-	        	return instructionTree[keyValue].arg3Type
-        	
-
-
-    def extractValueFromSymb(number, keyValue):
+    def _peekValue(self, operand):
+        """
+        returns value of constant or variable like _extractValueFromSymb, but None instead of an error
+        """
+        if operand[0] != 'var':
+            return operand[1]
+        frameObject = self._peekFrame(operand[2])
+        if frameObject is None or frameObject.slots[operand[3]] is undefined:
+            return None
+        return frameObject.slots[operand[3]]
+
+    def _extractValueFromSymb(self, operand):
         """
         returns value of variable or constant
         """
-        copyVal = None
-        if number == 2:
-            if 'F@' in instructionTree[keyValue].arg2Val:
-                frame, at, name = instructionTree[keyValue].arg2Val.partition('@')
-                frameObject = chooseFrame(frame)
-                if frameObject.variableExists(name):
-                    if frameObject.variableInitialised(name):
-                        copyVal = frameObject.getVal(name)
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': This variable has not been initialised.\n')
-                        sys.exit(56) 
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                    sys.exit(54)
-            else:
-                copyVal = instructionTree[keyValue].arg2Val
-        elif number == 1:
-            if 'F@' in instructionTree[keyValue].arg1Val:
-                frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-                frameObject = chooseFrame(frame)
-                if frameObject.variableExists(name):
-                    if frameObject.variableInitialised(name):
-                        copyVal = frameObject.getVal(name)
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': This variable has not been initialised.\n')
-                        sys.exit(56)
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                    sys.exit(54)
-            else:
-                copyVal = instructionTree[keyValue].arg1Val
-        elif number == 3:
-            if 'F@' in instructionTree[keyValue].arg3Val:
-                frame, at, name = instructionTree[keyValue].arg3Val.partition('@')
-                frameObject = chooseFrame(frame)
-                if frameObject.variableExists(name):
-                    if frameObject.variableInitialised(name):
-                        copyVal = frameObject.getVal(name)
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': This variable has not been initialised.\n')
-                        sys.exit(56) 
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                    sys.exit(54)
-            else:
-                copyVal = instructionTree[keyValue].arg3Val
+        if operand[0] != 'var':
+            return operand[1]
+        value = self._chooseFrame(operand[2]).slots[operand[3]]
+        if value is undefined:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable doesn\'t exist.\n')
+            sys.exit(54)
+        elif value is None:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable has not been initialised.\n')
+            sys.exit(56)
+        return value
 
-        return copyVal
+    def _getTargetFrame(self, operand):
+        """
+        returns frame of the variable which is going to be set, checks if the variable exists
+        """
+        frameObject = self._chooseFrame(operand[2])
+        if not frameObject.variableExists(operand[3]):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable doesn\'t exist.\n')
+            sys.exit(54)
+        return frameObject
+
+    def _getLabelTarget(self, ins):
+        """
+        returns instruction pointer of the label used by a jump instruction
+        """
+        if ins.target is None:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This label doesn\'t exist.\n')
+            sys.exit(52)
+        return ins.target
 
-    def doArithmeticOperation(keyValue, operator):
+    def _doArithmeticOperation(self, ins, operator):
         """
         controls var types and does arithmetic operations
         """
-        frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-        frameObject = chooseFrame(frame)
-        if frameObject.variableExists(name):
-            copyVal = extractValueFromSymb(2, keyValue)
-            frame2, at2, name2 = instructionTree[keyValue].arg3Val.partition('@')
-            #type = chooseFrame(frame2).getType(name2)
-            type = getTypeOfSymb(instructionTree[keyValue], 2)
-            if type == 'int':
-                copyVal2 = extractValueFromSymb(3, keyValue)
-                #frame3, at3, name3 = instructionTree[keyValue].arg3Val.partition('@')
-                #type2 = chooseFrame(frame3).getType(name3)
-                type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                if type2 == 'int':
-                    if operator == '+':
-                        val = int(copyVal) + int(copyVal2)
-                    elif operator == '-':
-                        val = int(copyVal) - int(copyVal2)
-                    elif operator == '*':
-                        val = int(copyVal) * int(copyVal2)
-                    elif operator == '/':
-                        try:
-                            val = int(copyVal) / int(copyVal2)
-                            val = int(round(val))
-                        except ZeroDivisionError:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': Division by zero.\n')
-                            sys.exit(57)
-                    frameObject.setVal(name, str(val), 'int')
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use arithmetic operators only with integers.\n')
-                    sys.exit(53)
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb1)
+        type = typeOfValue(copyVal)
+        if type == 'int':
+            copyVal2 = self._extractValueFromSymb(symb2)
+            type2 = typeOfValue(copyVal2)
+            if type2 == 'int':
+                if operator == '+':
+                    val = copyVal + copyVal2
+                elif operator == '-':
+                    val = copyVal - copyVal2
+                elif operator == '*':
+                    val = copyVal * copyVal2
+                elif operator == '/':
+                    try:
+                        val = int(round(copyVal / copyVal2))
+                    except ZeroDivisionError:
+                        self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Division by zero.\n')
+                        sys.exit(57)
+                frameObject.setVal(dest[3], val)
             else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': You can use arithmetic operators only with integers.\n')
+                self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use arithmetic operators only with integers.\n')
                 sys.exit(53)
         else:
-            sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-            sys.exit(54)
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use arithmetic operators only with integers.\n')
+            sys.exit(53)
 
-
-    def compare(keyValue, instruction):
+    def _compare(self, ins, instruction):
         """
         checks variable types and then executes the comparison
         """
-        frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-        frameObject = chooseFrame(frame)
-        if frameObject.variableExists(name):
-            #if not frameObject.variableInitialised(name):
-             #   sys.stderr.write('Error in instruction ' + keyValue + ': This variable has not been initialised.\n')
-              #  sys.exit(56) 
-            copyVal = extractValueFromSymb(2, keyValue)
-            type = getTypeOfSymb(instructionTree[keyValue], 2)
-            #frame2, at2, name2 = instructionTree[keyValue].arg2Val.partition('@')
-            #type = chooseFrame(frame2).getType(name2)
-            copyVal2 = extractValueFromSymb(3, keyValue)
-            #frame3, at3, name3 = instructionTree[keyValue].arg3Val.partition('@')
-            #type2 = chooseFrame(frame3).getType(name3)
-            type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-            if type == type2 or type == 'nil' or type2 == 'nil':
-                if (type == 'nil' and instruction != 'eq') or (type2 == 'nil' and instruction != 'eq'):
-                    sys.stderr.write('Error in instruction ' + keyValue + ': Only EQ instruction is allowed for nil.\n')
-                    sys.exit(53)
-                else:
-                    if instruction == 'lt':
-                        if type == 'int':
-                            if int(copyVal) < int(copyVal2):
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                        if type == 'bool':
-                            if copyVal == 'false':
-                                copyVal = False
-                            else:
-                                copyVal = True
-                            if copyVal2 == 'false':
-                                copyVal2 = False
-                            else:
-                                copyVal2 = True
-                            if copyVal < copyVal2:
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                        if type == 'string':
-                            if copyVal < copyVal2:
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                    if instruction == 'gt':
-                        if type == 'int':
-                            if int(copyVal) > int(copyVal2):
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                        if type == 'bool':
-                            if copyVal == 'false':
-                                copyVal = False
-                            else:
-                                copyVal = True
-                            if copyVal2 == 'false':
-                                copyVal2 = False
-                            else:
-                                copyVal2 = True
-                            if copyVal > copyVal2:
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                        if type == 'string':
-                            if copyVal > copyVal2:
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                    if instruction == 'eq':
-                        if type == 'int' and type2 == 'int':
-                            if int(copyVal) == int(copyVal2):
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-                        if type == 'bool' or type == 'string' or type == 'nil' or type2 == 'bool' or type2 == 'string' or type2 == 'nil':
-                            if copyVal == copyVal2:
-                                frameObject.setVal(name, 'true', 'bool')
-                            else:
-                                frameObject.setVal(name, 'false', 'bool')
-
-            else:
-                sys.stderr.write(
-                    'Error in instruction ' + keyValue + ': You can\'t compare variables of different types.\n')
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb1)
+        type = typeOfValue(copyVal)
+        copyVal2 = self._extractValueFromSymb(symb2)
+        type2 = typeOfValue(copyVal2)
+        if type == type2 or type == 'nil' or type2 == 'nil':
+            if (type == 'nil' and instruction != 'eq') or (type2 == 'nil' and instruction != 'eq'):
+                self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Only EQ instruction is allowed for nil.\n')
                 sys.exit(53)
+            if instruction == 'lt':
+                frameObject.setVal(dest[3], copyVal < copyVal2)
+            elif instruction == 'gt':
+                frameObject.setVal(dest[3], copyVal > copyVal2)
+            else:
+                frameObject.setVal(dest[3], type == type2 and copyVal == copyVal2)
         else:
-            sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-            sys.exit(54)
+            self.errorOutput.write(
+                'Error in instruction ' + str(self.instructionPointer + 1) + ': You can\'t compare variables of different types.\n')
+            sys.exit(53)
 
-    def boolOp(keyValue, instruction):
+    def _boolOp(self, ins, instruction):
         """
         checks variable types and then executes the boolean operator
         """
-        frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-        frameObject = chooseFrame(frame)
-        if frameObject.variableExists(name):
-            copyVal = extractValueFromSymb(2, keyValue)
-            type = getTypeOfSymb(instructionTree[keyValue], 2)
-            #frame2, at2, name2 = instructionTree[keyValue].arg2Val.partition('@')
-            #type = chooseFrame(frame3).getType(name2)
-            if type == 'bool':
-                if copyVal == 'false':
-                    copyVal = False
-                else:
-                    copyVal = True
-                if instruction == 'not':
-                    frameObject.setVal(name, str(not copyVal).lower(), 'bool')
-                else:
-                    copyVal2 = extractValueFromSymb(3, keyValue)
-                    #frame3, at3, name3 = instructionTree[keyValue].arg3Val.partition('@')
-                    #type2 = chooseFrame(frame3).getType(name3)
-                    type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                    if type2 == 'bool':
-                        if copyVal2 == 'false':
-                            copyVal2 = False
-                        else:
-                            copyVal2 = True
-                        if instruction == 'and':
-                            frameObject.setVal(name, str(copyVal and copyVal2).lower(), 'bool')
-                        else:
-                            frameObject.setVal(name, str(copyVal or copyVal2).lower(), 'bool')
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': AND/OR can only be used with bool variables.\n')
-                        sys.exit(53)
+        dest = ins.operands[0]
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(ins.operands[1])
+        type = typeOfValue(copyVal)
+        if type == 'bool':
+            if instruction == 'not':
+                frameObject.setVal(dest[3], not copyVal)
             else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': AND/OR/NOT can only be used with bool variables.\n')
-                sys.exit(53)
+                copyVal2 = self._extractValueFromSymb(ins.operands[2])
+                type2 = typeOfValue(copyVal2)
+                if type2 == 'bool':
+                    if instruction == 'and':
+                        frameObject.setVal(dest[3], copyVal and copyVal2)
+                    else:
+                        frameObject.setVal(dest[3], copyVal or copyVal2)
+                else:
+                    self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': AND/OR can only be used with bool variables.\n')
+                    sys.exit(53)
         else:
-            sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-            sys.exit(54)
-
-
-    def convertEscapeSeqs(toConvert):
-    	result = ''
-    	copyVal = re.sub(r'(\\[0-9]{3})', '#\g<1>#', toConvert)
-    	copyValArray = copyVal.split('#')
-    	for i in copyValArray:
-    		if i.startswith('\\'):
-    			match = re.search(r'[1-9][0-9]{1,2}', i)
-    			result += chr(int(match[0]))
-    			#print(chr(int(match[0])), end='')
-    		else:
-    			result += i
-    			#print(i, end='')
-    	return result
-
-    	#copyVal = re.sub(r'(\\[0-9]{3})', '#\g<1>#', copyVal)
-        #copyValArray = copyVal.split('#')
-        #for i in copyValArray:
-                    #    if i.startswith('\\'):
-                    #        match = re.search(r'[1-9][0-9]{1,2}', i)
-                    #        print(chr(int(match[0])), end='')
-                    #    else:
-                    #        print(i, end='')
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': AND/OR/NOT can only be used with bool variables.\n')
+            sys.exit(53)
 
 
     """
-    This is main loop. It loops through instructions in order defined by instruction pointer.
+    Handlers of single instructions. Each handler gets the compiled instruction
+    and returns the instruction pointer of the next instruction if it jumps.
     """
-    while instructionPointer <= len(instructionTree):
-        keyValue = str(instructionPointer)
-        jumpInstr = 0
+    def _execCreateframe(self, ins):
+        self.temporaryFrame = self._createFrame(self.localSlots)
+        self._accessibleFramesChanged()
+
+    def _execPushframe(self, ins):
+        if self.temporaryFrame is None:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You\'ve tried to use undefined temporary frame.\n')
+            sys.exit(55)
+        self.stack.append(self.temporaryFrame)
+        self.temporaryFrame = None
+        self._accessibleFramesChanged()
+
+    def _execPopframe(self, ins):
+        if not self.stack:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You\'ve tried to use undefined local frame.\n')
+            sys.exit(55)
+        self.temporaryFrame = self.stack.pop()
+        self._accessibleFramesChanged()
+
+    def _execLabel(self, ins):
+        # do nothing because labels were already processed
+        pass
+
+    def _execCall(self, ins):
+        self.callsStack.append(self.instructionPointer+1)
+        return self._getLabelTarget(ins)
+
+    def _execReturn(self, ins):
+        if not self.callsStack:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You didn\'t specify where to return.\n')
+            sys.exit(56)
+        return self.callsStack.pop()
+
+    def _execJump(self, ins):
+        return self._getLabelTarget(ins)
+
+    def _execExit(self, ins):
+        copyVal = self._extractValueFromSymb(ins.operands[0])
+        type = typeOfValue(copyVal)
+        if type != 'int':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': The exit code has to be integer.\n')
+            sys.exit(53)
+        if copyVal < 0 or copyVal > 49:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This exit code is not allowed.\n')
+            sys.exit(57)
+        sys.exit(copyVal)
+
+    def _execDefvar(self, ins):
+        frameObject = self._chooseFrame(ins.operands[0][2])
+        slot = ins.operands[0][3]
+        if frameObject.variableExists(slot):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable already exists.\n')
+            sys.exit(52)
+        frameObject.createVar(slot)
+
+    def _execMove(self, ins):
+        dest, symb = ins.operands
+        copyVal = self._extractValueFromSymb(symb)
+        self._getTargetFrame(dest).setVal(dest[3], copyVal)
+
+    def _execWrite(self, ins):
+        self.output.write(valueToString(self._extractValueFromSymb(ins.operands[0])))
+
+    def _execDprint(self, ins):
+        self.errorOutput.write(valueToString(self._extractValueFromSymb(ins.operands[0])))
+
+    def _execType(self, ins):
+        dest, symb = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        if symb[0] == 'var':
+            symbFrame = self._chooseFrame(symb[2])
+            if not symbFrame.variableExists(symb[3]):
+                self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable doesn\'t exist.\n')
+                sys.exit(54)
+            frameObject.setVal(dest[3], typeOfValue(symbFrame.getVal(symb[3])))
+        else:
+            frameObject.setVal(dest[3], symb[0])
+
+    def _execBreak(self, ins):
+        self.errorOutput.write('\n********************************************************************************\n' +
+                               'Number of executed instructions: '+str(self.instructionPointer + 1)+'\n')
+        self.errorOutput.write('\nGlobal frame:\n')
+        self.errorOutput.write(str(self.globalFrame))
+        self.errorOutput.write('\n')
+        self.errorOutput.write('\nTemporary frame:\n')
+        if self.temporaryFrame is not None:
+            self.errorOutput.write(str(self.temporaryFrame))
+        self.errorOutput.write('\n')
+        self.errorOutput.write('\nLocal frame:\n')
+        if self.stack:
+            self.errorOutput.write(str(self.stack[-1]))
+        self.errorOutput.write('\n')
+        self.errorOutput.write('\nProgram stack:\n')
+        if self.programStack:
+            self.errorOutput.write(str([(valueToLiteral(i), typeOfValue(i)) for i in self.programStack]))
+        self.errorOutput.write('\n')
+        self.errorOutput.write('********************************************************************************\n')
+
+    def _execPushs(self, ins):
+        self.programStack.append(self._extractValueFromSymb(ins.operands[0]))
+
+    def _execPops(self, ins):
+        if not self.programStack:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You\'ve tried to read from an empty stack.\n')
+            sys.exit(56)
+        dest = ins.operands[0]
+        frameObject = self._getTargetFrame(dest)
+        frameObject.setVal(dest[3], self.programStack.pop())
+
+    def _conditionalJump(self, ins, equal):
+        """
+        checks types of both symbols and returns the label if the condition is met
+        """
+        target = self._getLabelTarget(ins)
+        copyVal = self._extractValueFromSymb(ins.operands[1])
+        type = typeOfValue(copyVal)
+        copyVal2 = self._extractValueFromSymb(ins.operands[2])
+        type2 = typeOfValue(copyVal2)
+        if type != type2:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can\'t compare variables of different types.\n')
+            sys.exit(53)
+        if (copyVal == copyVal2) == equal:
+            return target
+
+    def _execJumpifeq(self, ins):
+        return self._conditionalJump(ins, True)
+
+    def _execJumpifneq(self, ins):
+        return self._conditionalJump(ins, False)
+
+    def _execConcat(self, ins):
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb1)
+        type = typeOfValue(copyVal)
+        copyVal2 = self._extractValueFromSymb(symb2)
+        type2 = typeOfValue(copyVal2)
+        if type == 'string' and type2 == 'string':
+            frameObject.setVal(dest[3], Rope.concat(copyVal, copyVal2))
+        else:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can only concatenate strings.\n')
+            sys.exit(53)
+
+    def _execStrlen(self, ins):
+        dest, symb = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb)
+        type = typeOfValue(copyVal)
+        if type == 'string':
+            frameObject.setVal(dest[3], len(copyVal))
+        else:
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use strlen only with string.\n')
+            sys.exit(53)
+
+    def _execGetchar(self, ins):
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb1)
+        type = typeOfValue(copyVal)
+        if type != 'string':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use strlen only with string.\n')
+            sys.exit(53)
+        index = self._extractValueFromSymb(symb2)
+        type2 = typeOfValue(index)
+        if type2 != 'int':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can only index string with integer.\n')
+            sys.exit(53)
+        if index < 0 or index >= len(copyVal):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Getchar index out of range.\n')
+            sys.exit(58)
+        frameObject.setVal(dest[3], copyVal[index])
+
+    def _execSetchar(self, ins):
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        if not frameObject.variableInitialised(dest[3]):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': This variable has not been initialised.\n')
+            sys.exit(56)
+        copyVal = self._extractValueFromSymb(dest)
+        type = typeOfValue(copyVal)
+        if type != 'string':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use setchar only with string.\n')
+            sys.exit(53)
+        index = self._extractValueFromSymb(symb1)
+        type2 = typeOfValue(index)
+        if type2 != 'int':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can only index string with integer.\n')
+            sys.exit(53)
+        if index < 0 or index >= len(copyVal):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Setchar index out of range.\n')
+            sys.exit(58)
+        copyVal3 = self._extractValueFromSymb(symb2)
+        type3 = typeOfValue(copyVal3)
+        if copyVal3 == '':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Symb2 is empty.\n')
+            sys.exit(58)
+        if type3 != 'string':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can only replace by char.\n')
+            sys.exit(53)
+        frameObject.setVal(dest[3], Rope.replace(copyVal, index, copyVal3[0]))
+
+    def _execStri2int(self, ins):
+        dest, symb1, symb2 = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb1)
+        type = typeOfValue(copyVal)
+        if type != 'string':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use stri2int only with string.\n')
+            sys.exit(53)
+        index = self._extractValueFromSymb(symb2)
+        type2 = typeOfValue(index)
+        if type2 != 'int':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can only index string with integer.\n')
+            sys.exit(53)
+        if index < 0 or index >= len(copyVal):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Stri2int index out of range.\n')
+            sys.exit(58)
+        frameObject.setVal(dest[3], ord(copyVal[index]))
+
+    def _execInt2char(self, ins):
+        dest, symb = ins.operands
+        frameObject = self._getTargetFrame(dest)
+        copyVal = self._extractValueFromSymb(symb)
+        type = typeOfValue(copyVal)
+        if type != 'int':
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': You can use int2char only with int.\n')
+            sys.exit(53)
+        try:
+            val = chr(copyVal)
+        except (ValueError, OverflowError):
+            self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Int2char index out of range.\n')
+            sys.exit(58)
+        frameObject.setVal(dest[3], val)
 
-        insts = insts+1
+    def _execAdd(self, ins):
+        self._doArithmeticOperation(ins, '+')
 
-        # stati extension: vars control
-        vars_tmp = 0
-        for k, v in globalFrame.vars.items():
-            if v is not None:
-                vars_tmp = vars_tmp+1
-        if temporaryFrame is not None:
-            for k, v in temporaryFrame.vars.items():
-                if v is not None:
-                    vars_tmp = vars_tmp + 1
-        if stack:
-            tmp = stack.pop()
-            for k, v in tmp.vars.items():
-                if v is not None:
-                    vars_tmp = vars_tmp + 1
-            stack.append(tmp)
+    def _execSub(self, ins):
+        self._doArithmeticOperation(ins, '-')
 
-        if vars_tmp > vars:
-            vars = vars_tmp
+    def _execMul(self, ins):
+        self._doArithmeticOperation(ins, '*')
 
+    def _execIdiv(self, ins):
+        self._doArithmeticOperation(ins, '/')
 
+    def _execLt(self, ins):
+        self._compare(ins, 'lt')
 
+    def _execGt(self, ins):
+        self._compare(ins, 'gt')
 
+    def _execEq(self, ins):
+        self._compare(ins, 'eq')
 
-        if instructionTree[keyValue].opcode == 'createframe':
-            temporaryFrame = Frame()
-        elif instructionTree[keyValue].opcode == 'pushframe':
-            if temporaryFrame is None:
-                sys.stderr.write('Error in instruction ' + keyValue + ': You\'ve tried to use undefined temporary frame.\n')
-                sys.exit(55)
-            else:
-                stack.append(temporaryFrame)
-                temporaryFrame = None
-        elif instructionTree[keyValue].opcode == 'popframe':
-            if not stack:
-                sys.stderr.write('Error in instruction ' + keyValue + ': You\'ve tried to use undefined local frame.\n')
-                sys.exit(55)
-            else:
-                temporaryFrame = stack.pop()
-        elif instructionTree[keyValue].opcode == 'label':
-            # do nothing because labels were already processed
-            pass
-        elif instructionTree[keyValue].opcode == 'call':
-            callsStack.append(instructionPointer+1)
-            if instructionTree[keyValue].arg1Val not in labels:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This label doesn\'t exist.\n')
-                sys.exit(52)
-            else:
-                jumpInstr = labels[instructionTree[keyValue].arg1Val]
-        elif instructionTree[keyValue].opcode == 'return':
-            if not callsStack:
-                sys.stderr.write('Error in instruction ' + keyValue + ': You didn\'t specify where to return.\n')
-                sys.exit(56)
-            jumpInstr = callsStack.pop()
-        elif instructionTree[keyValue].opcode == 'jump':
-            if instructionTree[keyValue].arg1Val not in labels:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This label doesn\'t exist.\n')
-                sys.exit(52)
-            else:
-                jumpInstr = labels[instructionTree[keyValue].arg1Val]
-        elif instructionTree[keyValue].opcode == 'exit':
-            copyVal = extractValueFromSymb(1, keyValue)
-            type = getTypeOfSymb(instructionTree[keyValue], 1)
-            if type != 'int':
-            	sys.stderr.write('Error in instruction ' + keyValue + ': The exit code has to be integer.\n')
-            	sys.exit(53)
-            pattern = re.compile(r'\d+')
-            if not re.match(pattern, copyVal):
-                sys.stderr.write('Error in instruction ' + keyValue + ': This exit code is not allowed.\n')
-                sys.exit(57)
-            else:
-                if int(copyVal) < 0 or int(copyVal) > 49:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This exit code is not allowed.\n')
-                    sys.exit(57)
-                else:
-                    sys.exit(int(copyVal))
-        elif instructionTree[keyValue].opcode == 'defvar':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable already exists.\n')
-                sys.exit(52)
-            else:
-            	frameObject.createVar(name)
-        elif instructionTree[keyValue].opcode == 'move':
-            copyVal = extractValueFromSymb(2, keyValue)
-            if copyVal == 'None' and instructionTree[keyValue].arg2Type == 'string':
-            	copyVal = ''
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-            	if instructionTree[keyValue].arg2Type == 'string':
-            		copyVal = convertEscapeSeqs(copyVal)
-            	frameObject.setVal(name, copyVal, instructionTree[keyValue].arg2Type)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'write':
-            copyVal = extractValueFromSymb(1, keyValue)
-            if copyVal is None or getTypeOfSymb(instructionTree[keyValue], 1) == 'nil':
-                print('', end='')
-            else:
-                if instructionTree[keyValue].arg1Type == 'string' or getTypeOfSymb(instructionTree[keyValue], 1) == 'string':
-                	print(copyVal, end='')
-                    #print('hledam shodu v: ', copyVal)
-                    #print('jsem v instrukci: ', keyValue)
-
-
-                    #copyVal = re.sub(r'(\\[0-9]{3})', '#\g<1>#', copyVal)
-                    #copyValArray = copyVal.split('#')
-                    #for i in copyValArray:
-                    #    if i.startswith('\\'):
-                    #        match = re.search(r'[1-9][0-9]{1,2}', i)
-                    #        print(chr(int(match[0])), end='')
-                    #    else:
-                    #        print(i, end='')
-                else:
-                	print(copyVal, end='')
-        elif instructionTree[keyValue].opcode == 'dprint':
-            copyVal = extractValueFromSymb(1, keyValue)
-            if copyVal is None:
-                sys.stderr.write('')
-            else:
-                if instructionTree[keyValue].arg1Type == 'string' or getTypeOfSymb(instructionTree[keyValue], 1) == 'string':
-                    copyVal = re.sub(r'(\\[0-9]{3})', '#\g<1>#', copyVal)
-                    copyValArray = copyVal.split('#')
-                    for i in copyValArray:
-                        if i.startswith('\\'):
-                            match = re.search(r'[1-9][0-9]{1,2}', i)
-                            sys.stderr.write(chr(int(match[0])))
-                        else:
-                            sys.stderr.write(i)
-                else:
-                    sys.stderr.write(copyVal)
-        elif instructionTree[keyValue].opcode == 'type':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                if 'F@' in instructionTree[keyValue].arg2Val:
-                	if instructionTree[keyValue].arg2Type == 'var':
-                		frame2, at2, name2 = instructionTree[keyValue].arg2Val.partition('@')
-                		if not chooseFrame(frame2).variableExists(name2):
-                			sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                			sys.exit(54)
-                	type = getTypeOfSymb(instructionTree[keyValue], 2)
-                	if type == 'nil':
-                		if chooseFrame(frame2).variableInitialised(name2):
-                			frameObject.setVal(name, 'nil', 'string')
-                		else:
-                			frameObject.setVal(name, '', 'string')
-                	else:
-                		frameObject.setVal(name, type, 'string')
-                else:
-                    frameObject.setVal(name, instructionTree[keyValue].arg2Type, 'string')
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'break':
-            sys.stderr.write('\n********************************************************************************\n' +
-         'Number of executed instructions: '+str(instructionPointer)+'\n')
-            sys.stderr.write('\nGlobal frame:\n')
-            sys.stderr.write(str(globalFrame))
-            sys.stderr.write('\n')
-            sys.stderr.write('\nTemporary frame:\n')
-            if temporaryFrame is not None:
-                sys.stderr.write(str(temporaryFrame))
-            sys.stderr.write('\n')
-            sys.stderr.write('\nLocal frame:\n')
-            if stack:
-                tmp = stack.pop()
-                sys.stderr.write(str(tmp))
-                stack.append(tmp)
-            sys.stderr.write('\n')
-            sys.stderr.write('\nProgram stack:\n')
-            if programStack:
-                sys.stderr.write(str(programStack))
-            sys.stderr.write('\n')
-            sys.stderr.write('********************************************************************************\n')
-        elif instructionTree[keyValue].opcode == 'pushs':
-            copyVal = extractValueFromSymb(1, keyValue)
-            type = getTypeOfSymb(instructionTree[keyValue].arg1Type, 1)
-            tuple = (copyVal, type)
-            programStack.append(tuple)
-        elif instructionTree[keyValue].opcode == 'pops':
-            if programStack:
-                frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-                frameObject = chooseFrame(frame)
-                if frameObject.variableExists(name):
-                	tmp = programStack.pop()
-                	frameObject.setVal(name, tmp[0], tmp[1])
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                    sys.exit(54)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': You\'ve tried to read from an empty stack.\n')
-                sys.exit(56)
-        elif instructionTree[keyValue].opcode == 'jumpifeq':
-            if instructionTree[keyValue].arg1Val not in labels:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This label doesn\'t exist.\n')
-                sys.exit(52)
-            else:
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                copyVal2 = extractValueFromSymb(3, keyValue)
-                type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                if type == type2:
-                    if type == 'int':
-                        copyVal = copyVal.replace('+', '')
-                        copyVal2 = copyVal2.replace('+', '')
-                    if copyVal == copyVal2:
-                        jumpInstr = labels[instructionTree[keyValue].arg1Val]
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can\'t compare variables of different types.\n')
-                    sys.exit(53)
-        elif instructionTree[keyValue].opcode == 'jumpifneq':
-            if instructionTree[keyValue].arg1Val not in labels:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This label doesn\'t exist.\n')
-                sys.exit(52)
-            else:
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                copyVal2 = extractValueFromSymb(3, keyValue)
-                type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                if type == type2:
-                    if type == 'int':
-                        copyVal = copyVal.replace('+', '')
-                        copyVal2 = copyVal2.replace('+', '')
-                    if copyVal != copyVal2:
-                        jumpInstr = labels[instructionTree[keyValue].arg1Val]
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can\'t compare variables of different types.\n')
-                    sys.exit(53)
-        elif instructionTree[keyValue].opcode == 'concat':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-            	copyVal = extractValueFromSymb(2, keyValue)
-            	type = getTypeOfSymb(instructionTree[keyValue], 2)
-            	copyVal2 = extractValueFromSymb(3, keyValue)
-            	type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-            	if type == 'string' and type2 == 'string':
-            		val = copyVal + copyVal2
-            		frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            		frameObject.setVal(name, val, 'string')
-            	else:
-            		sys.stderr.write('Error in instruction ' + keyValue + ': You can only concatenate strings.\n')
-            		sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'strlen':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                if instructionTree[keyValue].arg2Type == 'string':
-                	# it is a constant -> escape seqs
-                	copyVal = convertEscapeSeqs(copyVal)
-                if type == 'string':
-                	if copyVal == 'None' and instructionTree[keyValue].arg2Val != 'var':
-                		frameObject.setVal(name, str(0), 'int')
-                	else:
-                		#copyVal = re.sub(r'\\[0-9]{3}', '.', copyVal)
-                		frameObject.setVal(name, str(len(copyVal)), 'int')
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use strlen only with string.\n')
-                    sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'getchar':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                if type == 'string':
-                    copyVal2 = extractValueFromSymb(3, keyValue)
-                    type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                    if type2 == 'int':
-                        withoutEscapeSeqs = re.sub(r'\\[0-9]{3}', '.', copyVal)
-                        length = len(withoutEscapeSeqs)
-                        copyVal2 = copyVal2.replace('+', '')
-                        if int(copyVal2) >= 0 and int(copyVal2) < length:
-                            matches = re.search(r'\\[0-9]{3}', copyVal)
-                            result = withoutEscapeSeqs[int(copyVal2):int(copyVal2)+1]
-                            if result == '.':
-                                sliced = withoutEscapeSeqs[0:int(copyVal2)+1]
-                                index = sliced.count('.')
-                                result = matches[index-1]
-                            frameObject.setVal(name, result, 'string')
-                        else:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': Getchar index out of range.\n')
-                            sys.exit(58)
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': You can only index string with integer.\n')
-                        sys.exit(53)
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use strlen only with string.\n')
-                    sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'setchar':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                if not frameObject.variableInitialised(name):
-                    sys.stderr.write('Error in instruction ' + keyValue + ': This variable has not been initialised.\n')
-                    sys.exit(56) 
-                copyVal = extractValueFromSymb(1, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 1)
-                if type == 'string':
-                    copyVal2 = extractValueFromSymb(2, keyValue)
-                    type2 = getTypeOfSymb(instructionTree[keyValue], 2)
-                    if type2 == 'int':
-                        copyVal2 = copyVal2.replace('+', '')
-                        withoutEscapeSeqs = re.sub(r'\\[0-9]{3}', '.', copyVal)
-                        length = len(withoutEscapeSeqs)
-                        #print(extractValueFromSymb(3, keyValue))
-                        if int(copyVal2) >= 0 and int(copyVal2) < length:
-                            copyVal3 = extractValueFromSymb(3, keyValue)
-                            type3 = getTypeOfSymb(instructionTree[keyValue], 3)
-                            if copyVal3 == '':
-                            	sys.stderr.write('Error in instruction ' + keyValue + ': Symb2 is empty.\n')
-                            	sys.exit(58)
-                            if type3 == 'string':
-                                matches = re.findall(r'\\[0-9]{3}', copyVal)
-                                result = withoutEscapeSeqs[int(copyVal2) - 1:int(copyVal2)]
-                                if result == '.':
-                                    sliced = withoutEscapeSeqs[0:int(copyVal2)+1]
-                                    index = sliced.count('.')
-                                    matches[index - 1] = copyVal3[0]
-                                else:
-                                    withoutEscapeSeqs = withoutEscapeSeqs[:int(copyVal2)] + copyVal3[0] + withoutEscapeSeqs[(int(copyVal2) + 1):]
-                                for i in matches:
-                                    withoutEscapeSeqs = withoutEscapeSeqs.replace('.', i, 1)
-                                #print(withoutEscapeSeqs)
-                                frameObject.setVal(name, withoutEscapeSeqs, 'string')
-                            else:
-                                sys.stderr.write('Error in instruction ' + keyValue + ': You can only replace by char.\n')
-                                sys.exit(53)
-                        else:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': Setchar index out of range.\n')
-                            sys.exit(58)
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': You can only index string with integer.\n')
-                        sys.exit(53)
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use setchar only with string.\n')
-                    sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'stri2int':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                if type == 'string':
-                    copyVal2 = extractValueFromSymb(3, keyValue)
-                    type2 = getTypeOfSymb(instructionTree[keyValue], 3)
-                    if type2 == 'int':
-                        withoutEscapeSeqs = re.sub(r'\\[0-9]{3}', '.', copyVal)
-                        length = len(withoutEscapeSeqs)
-                        copyVal2 = copyVal2.replace('+', '')
-                        if int(copyVal2) >= 0 and int(copyVal2) < length:
-                            matches = re.search(r'\\[0-9]{3}', copyVal)
-                            result = withoutEscapeSeqs[int(copyVal2):int(copyVal2)+1]
-                            if result == '.':
-                                copyVal = withoutEscapeSeqs[0:int(copyVal2)+1]
-                                index = copyVal.count('.')
-                                result = matches[index - 1]
-                                match = re.search(r'[1-9][0-9]{1,2}', result)
-                                frameObject.setVal(name, match[0], 'int')
-                            else:
-                                frameObject.setVal(name, str(ord(result)), 'int')
-                        else:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': Stri2int index out of range.\n')
-                            sys.exit(58)
-                    else:
-                        sys.stderr.write(
-                            'Error in instruction ' + keyValue + ': You can only index string with integer.\n')
-                        sys.exit(53)
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use stri2int only with string.\n')
-                    sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'int2char':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            if frameObject.variableExists(name):
-                copyVal = extractValueFromSymb(2, keyValue)
-                type = getTypeOfSymb(instructionTree[keyValue], 2)
-                if type == 'int':
-                    try:
-                        val = chr(int(copyVal))
+    def _execAnd(self, ins):
+        self._boolOp(ins, 'and')
 
-                    except ValueError:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': Int2char index out of range.\n')
-                        sys.exit(58)
-                    frameObject.setVal(name, val, 'string')
-                else:
-                    sys.stderr.write('Error in instruction ' + keyValue + ': You can use int2char only with int.\n')
-                    sys.exit(53)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
-        elif instructionTree[keyValue].opcode == 'add':
-            doArithmeticOperation(keyValue, '+')
-        elif instructionTree[keyValue].opcode == 'sub':
-            doArithmeticOperation(keyValue, '-')
-        elif instructionTree[keyValue].opcode == 'mul':
-            doArithmeticOperation(keyValue, '*')
-        elif instructionTree[keyValue].opcode == 'idiv':
-            doArithmeticOperation(keyValue, '/')
-        elif instructionTree[keyValue].opcode == 'lt':
-            compare(keyValue, 'lt')
-        elif instructionTree[keyValue].opcode == 'gt':
-            compare(keyValue, 'gt')
-        elif instructionTree[keyValue].opcode == 'eq':
-            compare(keyValue, 'eq')
-        elif instructionTree[keyValue].opcode == 'and':
-            boolOp(keyValue, 'and')
-        elif instructionTree[keyValue].opcode == 'or':
-            boolOp(keyValue, 'or')
-        elif instructionTree[keyValue].opcode == 'not':
-            boolOp(keyValue, 'not')
-        elif instructionTree[keyValue].opcode == 'read':
-            frame, at, name = instructionTree[keyValue].arg1Val.partition('@')
-            frameObject = chooseFrame(frame)
-            type = ''
-            if frameObject.variableExists(name):
-                if arguments.input:
-                    #print('... reading from file')
-                    try:
-                        val = inputFile[filePosition]
-                        if instructionTree[keyValue].arg2Val == 'int':
-                        	type = 'int'
-                        	try:
-                        		val = int(val)
-                        	except:
-                        		val = 0
-                        elif instructionTree[keyValue].arg2Val == 'string':
-                        	type = 'string'
-                        	try:
-                        		val = str(val)
-                        	except:
-                        		val = ''
-                        elif instructionTree[keyValue].arg2Val == 'bool':
-                        	type = 'bool'
-                        	if val.lower() == 'true':
-                        		val = 'true'
-                        	else:
-                        		val = 'false'
-                        else:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': This type isn\'t allowed.\n')
-                            sys.exit(32)
-                    except:
-                        if instructionTree[keyValue].arg2Val == 'int':
-                        	type = 'int'
-                        	val = 0
-                        elif instructionTree[keyValue].arg2Val == 'string':
-                        	type = 'string'
-                        	val = ''
-                        elif instructionTree[keyValue].arg2Val == 'bool':
-                        	type = 'bool'
-                        	val = 'false'
-                        else:
-                            sys.stderr.write('Error in instruction ' + keyValue + ': This type isn\'t allowed.\n')
-                            sys.exit(32)
-
-
-                    filePosition = filePosition + 1
+    def _execOr(self, ins):
+        self._boolOp(ins, 'or')
 
-                else:
-                    try:
-                        val = input()
-                    except (EOFError, KeyboardInterrupt):
-                        val = None
-                    if instructionTree[keyValue].arg2Val == 'int':
-                    	type = 'int'
-                    	try:
-                    		val = int(val)
-                    	except:
-                    		val = 0
-                    elif instructionTree[keyValue].arg2Val == 'string':
-                    	type = 'string'
-                    	try:
-                    		val = str(val)
-                    	except:
-                    		val = ''
-                    elif instructionTree[keyValue].arg2Val == 'bool':
-                    	type = 'bool'
-                    	if val.lower() == 'true':
-                    		val = 'true'
-                    	else:
-                    		val = 'false'
-                    else:
-                        sys.stderr.write('Error in instruction ' + keyValue + ': This type isn\'t allowed.\n')
-                        sys.exit(32)
-                frameObject.setVal(name, str(val), type)
-            else:
-                sys.stderr.write('Error in instruction ' + keyValue + ': This variable doesn\'t exist.\n')
-                sys.exit(54)
+    def _execNot(self, ins):
+        self._boolOp(ins, 'not')
 
+    def _execRead(self, ins):
+        dest = ins.operands[0]
+        frameObject = self._getTargetFrame(dest)
+        type = ins.operands[1][1]
+        val = self.inputReader.readLine()
+        if type == 'int':
+            try:
+                val = int(val)
+            except:
+                val = 0
+        elif type == 'string':
+            if val is None:
+                val = ''
         else:
-            sys.stderr.write('Error in instruction ' + keyValue + ': Unsupported instruction.\n')
-            sys.exit(52)
+            val = val is not None and val.lower() == 'true'
+        frameObject.setVal(dest[3], val)
 
+    def _execUnsupported(self, ins):
+        self.errorOutput.write('Error in instruction ' + str(self.instructionPointer + 1) + ': Unsupported instruction.\n')
+        sys.exit(52)
 
-        # end of main while loop, check if there is jump instruction or increment instruction pointer
-        if jumpInstr != 0:
-            instructionPointer = int(jumpInstr)
-        else:
-            instructionPointer = instructionPointer + 1
 
+# maintain arguments
+parser = MyParser(add_help=False)
 
-    if arguments.insts or arguments.vars:
-        statsOut = ''
-        for ar in sys.argv:
-            if ar == '--vars':
-                statsOut += str(vars)
-                statsOut += '\n'
-            elif ar == '--insts':
-                statsOut += str(insts)
-                statsOut += '\n'
+parser.add_argument('--help', '-help', action='store_true')
+parser.add_argument('--source', '-source')
+parser.add_argument('--input', '-input')
+parser.add_argument('--stati', '-stati')
+parser.add_argument('--insts', '-insts', action='store_true')
+parser.add_argument('--vars', '-vars', action='store_true')
+parser.add_argument('--input-mmap', '-input-mmap', action='store_true')
+parser.add_argument('--cache-dir', '-cache-dir')
+parser.add_argument('--cache-size', '-cache-size', type=int, default=64 * 1024 * 1024)
+parser.add_argument('--jobs', '-jobs', type=int, default=1)
+parser.add_argument('--batch-jobs', '-batch-jobs', type=int, default=1)
+parser.add_argument('--buffer-size', '-buffer-size', type=int, default=65536)
+parser.add_argument('--line-buffered', '-line-buffered', action='store_true')
+parser.add_argument('--profile', '-profile')
+parser.add_argument('--sample-profile', '-sample-profile')
+parser.add_argument('--sample-interval', '-sample-interval', type=float, default=1.0)
+parser.add_argument('--batch', '-batch')
+parser.add_argument('--max-insts', '-max-insts', type=int)
+parser.add_argument('--timeout', '-timeout', type=float)
+parser.add_argument('--max-memory', '-max-memory', type=int)
+parser.add_argument('--fuse', '-fuse', action='store_true')
+parser.add_argument('--optimize', '-optimize', action='store_true')
+parser.add_argument('--optimize-report', '-optimize-report')
+parser.add_argument('--infer-types', '-infer-types', action='store_true')
+parser.add_argument('--backend', '-backend', choices=('interpreter', 'pycompile'), default='interpreter')
+
+
+def writeStatistics(fileName, interpreter, errorOutput=None):
+    """
+    saves statistics of the last run in the order of --insts and --vars on the command line
+    an error is written to errorOutput (sys.stderr by default)
+    """
+    statsOut = ''
+    for ar in sys.argv:
+        if ar == '--vars':
+            statsOut += str(interpreter.varsStatistics.maximum)
+            statsOut += '\n'
+        elif ar == '--insts':
+            statsOut += str(interpreter.insts)
+            statsOut += '\n'
+    try:
+        file = open(fileName, "w")
+        file.seek(0)
+        file.write(statsOut)
+        file.truncate()
+    except IOError:
+        (errorOutput if errorOutput is not None else sys.stderr).write("File for stats can\'t be opened!\n")
+        sys.exit(12)
+
+
+def writeOptimizationReport(fileName, interpreter):
+    """
+    saves instructions left out by --optimize, a line "order OPCODE: reason" for each of them and a summary
+    """
+    lines = [str(instructionPointer + 1) + ' ' + interpreter.program[instructionPointer].opcode.upper() + ': ' + reason
+             for instructionPointer, reason in interpreter.optimizations]
+    unreachable = sum(1 for instructionPointer, reason in interpreter.optimizations if reason == 'unreachable')
+    lines.append('Left out ' + str(len(interpreter.optimizations)) + ' of ' + str(len(interpreter.program)) +
+                 ' instructions, ' + str(unreachable) + ' of them unreachable.')
+    try:
+        with open(fileName, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+    except IOError:
+        sys.stderr.write('File for the optimization report can\'t be opened!\n')
+        sys.exit(12)
+
+
+def readManifest(fileName):
+    """
+    reads the manifest of --batch, each line contains paths of input, output and optionally of statistics
+    empty lines and lines starting with # are skipped
+    """
+    jobs = []
+    try:
+        with open(fileName, 'r') as manifest:
+            for number, line in enumerate(manifest, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                if len(fields) > 3 or len(fields) < 2:
+                    sys.stderr.write('Line ' + str(number) + ' of the batch manifest should be "input output [stati]".\n')
+                    sys.exit(10)
+                jobs.append((fields[0], fields[1], fields[2] if len(fields) == 3 else None))
+    except IOError:
+        sys.stderr.write('Can\'t open the batch manifest.\n')
+        sys.exit(11)
+    return jobs
+
+
+def runJob(interpreter, inputName, outputName, statiName, statistics):
+    """
+    runs the loaded program with input and output of one job of the batch, returns the exit code of the job
+    (99 if the job has failed by an unexpected exception)
+    runtime errors, dprint, break and other diagnostics of the job are written to the file output + '.err'
+    """
+    errorName = outputName + '.err'
+    try:
+        errorFile = open(errorName, 'w')
+    except IOError:
+        sys.stderr.write('Can\'t open the error file ' + errorName + '.\n')
+        return 12
+    with errorFile:
         try:
-            file = open(arguments.stati, "w")
-            file.seek(0)
-            file.write(statsOut)
-            file.truncate()
-        except IOError:
-            sys.stderr.write("File for stats can\'t be opened!\n")
-            exit(12)
+            try:
+                inputFile = open(inputName, 'r')
+            except IOError:
+                errorFile.write('Can\'t open the input file ' + inputName + '.\n')
+                sys.exit(11)
+            with inputFile:
+                try:
+                    outputFile = open(outputName, 'w')
+                except IOError:
+                    errorFile.write('Can\'t open the output file ' + outputName + '.\n')
+                    sys.exit(12)
+                with outputFile:
+                    interpreter.run(inputFile, outputFile, errorFile)
+            if statistics and statiName is not None:
+                writeStatistics(statiName, interpreter, errorFile)
+        except SystemExit as e:
+            return e.code
+        except Exception as e:
+            # e.g. input which isn't valid UTF-8, only this job ends
+            errorFile.write('Job ' + inputName + ' failed: ' + type(e).__name__ + ': ' + str(e) + '\n')
+            return 99
+    return 0
+
+
+# interpreter of a worker process running jobs of the batch (--batch with --batch-jobs)
+batchInterpreter = None
+batchStatistics = False
+
+def initBatchWorker(program, options, statistics):
+    """
+    prepares a worker process of the batch, it gets the checked program (Instruction.toCache tuples) only once
+    """
+    global batchInterpreter, batchStatistics
+    batchInterpreter = Interpreter(**options)
+    batchInterpreter.loadInstructions([Instruction.fromCache(data) for data in program])
+    batchStatistics = statistics
+
+def runBatchWorkerJob(job):
+    """
+    runs one job (index in the manifest, (input, output, stati)) of the batch in a worker process,
+    returns the index and the exit code
+    """
+    index, (inputName, outputName, statiName) = job
+    return index, runJob(batchInterpreter, inputName, outputName, statiName, batchStatistics)
+
+def runBatchParallel(interpreter, options, batch, statistics, processes):
+    """
+    runs jobs of the batch in a pool of processes, each job is run by the interpreter of its worker
+    yields indexes of jobs in the manifest with their exit codes as soon as jobs finish (a slow job doesn't hold
+    back the others)
+    """
+    program = [ins.toCache() for ins in interpreter.program]
+    with multiprocessing.Pool(processes, initBatchWorker, (program, options, statistics)) as pool:
+        for index, code in pool.imap_unordered(runBatchWorkerJob, enumerate(batch)):
+            yield index, code
+
 
+def main():
+    """
+    runs the script with arguments from the command line
+    """
+    arguments = parser.parse_args()
+
+    if arguments.help:
+        if len(sys.argv) != 2:
+            sys.stderr.write('It seems you used wrong parameters. You can\'t use --help with other parameters.\n')
+            sys.exit(10)
+        print('********************************************************************************\n' +
+             '** Run script:                                                                **\n' +
+             '** 1. with parameter --help (shows help)                                      **\n' +
+             '** 2. with parameter --source or --input (you can use both, source is for     **\n' +
+             '**    source code and input can contain user\'s input                          **\n' +
+             '** 3. with parameter --stati=file and --insts|--vars                          **\n' +
+             '**    (saves statistics into file)                                            **\n' +
+             '** 4. with parameter --input-mmap (file given by --input is mapped to memory, **\n' +
+             '**    suitable for big files)                                                 **\n' +
+             '** 5. with parameter --cache-dir=dir (checked programs are saved to dir and   **\n' +
+             '**    loaded from it next time) and --cache-size=n (max. size of the cache    **\n' +
+             '**    in bytes)                                                               **\n' +
+             '** 6. with parameter --jobs=n (instructions are checked by n processes)       **\n' +
+             '** 7. with parameter --buffer-size=n (output is written in blocks of n        **\n' +
+             '**    characters, 0 disables buffering) and --line-buffered (output is        **\n' +
+             '**    written after each line)                                                **\n' +
+             '** 8. with parameter --profile=file (counts and times of instructions,        **\n' +
+             '**    opcodes and functions are saved as JSON to file and as text to          **\n' +
+             '**    file.txt)                                                               **\n' +
+             '** 9. with parameter --sample-profile=file (executed instructions and calls   **\n' +
+             '**    are sampled every --sample-interval=n milliseconds, default 1, and      **\n' +
+             '**    saved to file in the collapsed stack format for flame graphs)           **\n' +
+             '** 10. with parameter --batch=file (the program is loaded once and run for    **\n' +
+             '**    each line "input output [stati]" of file, a line with the input and     **\n' +
+             '**    exit code is written for each job, errors and DPRINT, BREAK output of   **\n' +
+             '**    a job go to output.err, use --source or stdin for program)              **\n' +
+             '**    and --batch-jobs=n (jobs are run by n processes, default 1)             **\n' +
+             '** 11. with parameter --max-insts=n, --timeout=s and --max-memory=b (the      **\n' +
+             '**    program, or a job of --batch, ends with code 59 after n instructions,   **\n' +
+             '**    s seconds or when the process uses more than b bytes of memory)         **\n' +
+             '** 12. with parameter --fuse (frequent sequences of instructions, e.g. ADD,   **\n' +
+             '**    LT, JUMPIFEQ, are run as one superinstruction, the behaviour is the     **\n' +
+             '**    same)                                                                   **\n' +
+             '** 13. with parameter --optimize (labels, jumps to jumps and other            **\n' +
+             '**    instructions which do nothing are run together with the next            **\n' +
+             '**    instruction, the behaviour is the same) and --optimize-report=file      **\n' +
+             '**    (left out and unreachable instructions are saved to file)               **\n' +
+             '** 14. with parameter --infer-types (types of variables are inferred before   **\n' +
+             '**    the run, instructions with operands of known types are run without      **\n' +
+             '**    checks of types and frames, the behaviour is the same)                  **\n' +
+             '** 15. with parameter --backend=pycompile (the program is translated to Python**\n' +
+             '**    functions, one for each basic block, and run by Python, the behaviour is**\n' +
+             '**    the same; with --profile, --sample-profile or a program too big for     **\n' +
+             '**    Python the program is interpreted, --backend=interpreter is the default)**\n' +
+             '**                                                                            **\n' +
+             '** It is NECESSARY to use either --source or --input! The other one           **\n' +
+             '** is loaded from stdin.                                                      **\n' +
+             '**                                                                            **\n' +
+             '** Examples:                                                                  **\n' +
+             '** python3.7 interpret.py --source=file1 --input=file2 --stati --inst         **\n' +
+             '** python3.7 interpret.py --help                                              **\n' +
+             '** python3.7 interpret.py --input=file2                                       **\n' +
+             '********************************************************************************\n')
+    elif arguments.source or arguments.input or arguments.batch:
+        if (arguments.source and arguments.source == '' and (not arguments.input or arguments.input == '')) or (arguments.input and arguments.input == '' and (not arguments.source or arguments.source == '')):
+            sys.stderr.write('You have to specify either input file or source file or both.\n')
+            sys.exit(10)
+        if arguments.stati and not arguments.input == '' and not (arguments.insts or arguments.vars):
+            sys.stderr.write('You have to specify what statistics you need.\n')
+            sys.exit(10)
+        if arguments.buffer_size < 0 or arguments.cache_size < 0:
+            sys.stderr.write('The size of the buffer or cache can\'t be negative.\n')
+            sys.exit(10)
+        if arguments.jobs < 1 or arguments.batch_jobs < 1:
+            sys.stderr.write('The number of jobs has to be positive.\n')
+            sys.exit(10)
+        if arguments.sample_interval <= 0:
+            sys.stderr.write('The sampling interval has to be positive.\n')
+            sys.exit(10)
+        if ((arguments.max_insts is not None and arguments.max_insts < 0) or (arguments.timeout is not None and arguments.timeout <= 0)
+                or (arguments.max_memory is not None and arguments.max_memory <= 0)):
+            sys.stderr.write('The limits of instructions, time and memory have to be positive.\n')
+            sys.exit(10)
+        if arguments.batch and (arguments.input or arguments.profile or arguments.sample_profile):
+            sys.stderr.write('You can\'t use --input or profiles with --batch.\n')
+            sys.exit(10)
+        batch = readManifest(arguments.batch) if arguments.batch else None
+
+        options = dict(countVars=arguments.vars, profile=arguments.profile, sampleProfile=arguments.sample_profile,
+                       sampleInterval=arguments.sample_interval / 1000, bufferSize=arguments.buffer_size,
+                       lineBuffered=arguments.line_buffered, inputMmap=arguments.input_mmap,
+                       maxInsts=arguments.max_insts, timeout=arguments.timeout, maxMemory=arguments.max_memory,
+                       fuse=arguments.fuse, optimize=arguments.optimize or arguments.optimize_report is not None,
+                       inferTypes=arguments.infer_types, backend=arguments.backend)
+        interpreter = Interpreter(**options)
+
+        # run the program!
+        cache = ProgramCache(arguments.cache_dir, arguments.cache_size) if arguments.cache_dir else None
+        # loading creates lots of objects which live until the end, collecting garbage meanwhile would only waste time
+        # (only here, the script owns the process, Interpreter.load doesn't touch the garbage collector)
+        gc.disable()
+        try:
+            interpreter.load(arguments.source if arguments.source else sys.stdin.buffer, arguments.jobs, cache)
+
+            # loaded program won't be checked by garbage collector anymore (gc.freeze is new in Python 3.7)
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+        finally:
+            gc.enable()
+        if arguments.optimize_report:
+            writeOptimizationReport(arguments.optimize_report, interpreter)
+        if arguments.batch:
+            statistics = arguments.insts or arguments.vars
+            if arguments.batch_jobs > 1:
+                codes = runBatchParallel(interpreter, options, batch, statistics, arguments.batch_jobs)
+            else:
+                codes = ((index, runJob(interpreter, inputName, outputName, statiName, statistics))
+                         for index, (inputName, outputName, statiName) in enumerate(batch))
+            # each job is reported by a line with its input and exit code when it finishes
+            for index, code in codes:
+                sys.stdout.write(batch[index][0] + '\t' + str(code) + '\n')
+                sys.stdout.flush()
+            return
+        if arguments.input:
+            try:
+                inputFile = open(arguments.input, 'r')
+            except IOError:
+                sys.stderr.write('Can\'t open the input file.\n')
+                sys.exit(11)
+            with inputFile:
+                interpreter.run(inputFile)
+        else:
+            interpreter.run(sys.stdin)
+
+        if arguments.insts or arguments.vars:
+            writeStatistics(arguments.stati, interpreter)
+    else:
+        sys.stderr.write('It seems you used wrong parameters. Try it again or use --help.\n')
+        sys.exit(10)
 
 
-else:
-    sys.stderr.write('It seems you used wrong parameters. Try it again or use --help.\n')
-    sys.exit(10)
\ No newline at end of file
+if __name__ == '__main__':
+    main()